@@ -8,8 +8,6 @@ This module contains all the LangGraph agents that power the system:
 - Monitoring Agent: Alert generation and threshold monitoring
 """
 
-from .forecasting_agent import ForecastingAgent
-
 # Other agents will be added later
 # from .route_optimization_agent import RouteOptimizationAgent
 # from .inventory_matching_agent import InventoryMatchingAgent
@@ -18,3 +16,11 @@ from .forecasting_agent import ForecastingAgent
 __all__ = [
     "ForecastingAgent"
 ]
+
+def __getattr__(name):
+    # Import lazily so that loading a single submodule (e.g. the workflow)
+    # does not pull in Prophet/TensorFlow through the package
+    if name == "ForecastingAgent":
+        from .forecasting_agent import ForecastingAgent
+        return ForecastingAgent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
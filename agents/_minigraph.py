@@ -0,0 +1,123 @@
+"""
+Minimal stand-in for the LangGraph API used by the supply chain workflow
+
+When LangGraph is not installed the workflow builds the same graph with these
+classes, so there is a single orchestration code path. Only the subset the
+workflow relies on is implemented: nodes, static edges, a conditional entry
+point, Command routing, reducer-annotated state, run context and streaming of
+"updates"/"custom" events. Nodes that run in the same step execute
+concurrently and see the state as of the start of that step.
+"""
+
+from typing import Any, AsyncIterator, Callable, Dict, Generic, List, Optional, TypeVar, Union, get_type_hints
+from dataclasses import dataclass, fields, is_dataclass
+import asyncio
+import inspect
+
+END = "__end__"
+
+C = TypeVar("C")
+N = TypeVar("N")
+
+@dataclass
+class Runtime(Generic[C]):
+    """Per-run context handed to nodes that accept a `runtime` argument"""
+    context: C
+    stream_writer: Callable[[Any], None]
+
+class Command(Generic[N]):
+    """State update combined with the next node(s) to run"""
+
+    def __init__(self, update: Optional[Dict[str, Any]] = None, goto: Union[str, List[str]] = ()):
+        self.update = update or {}
+        self.goto = [goto] if isinstance(goto, str) else list(goto)
+
+class MemorySaver:
+    """Accepted for API compatibility; the minimal graph keeps no checkpoints"""
+
+class StateGraph:
+    """Builder and runner for a small state graph"""
+
+    def __init__(self, state_schema: type, context_schema: Optional[type] = None):
+        self.state_schema = state_schema
+        self.nodes: Dict[str, Callable] = {}
+        self.edges: Dict[str, List[str]] = {}
+        self.entry: Optional[Callable[[Any], Union[str, List[str]]]] = None
+        self.reducers = {
+            key: hint.__metadata__[0]
+            for key, hint in get_type_hints(state_schema, include_extras=True).items()
+            if hasattr(hint, "__metadata__")
+        }
+
+    def add_node(self, name: str, action: Callable):
+        self.nodes[name] = action
+
+    def add_edge(self, start: str, end: str):
+        self.edges.setdefault(start, []).append(end)
+
+    def set_entry_point(self, name: str):
+        self.entry = lambda state: name
+
+    def set_conditional_entry_point(self, path: Callable[[Any], Union[str, List[str]]], path_map: Optional[List[str]] = None):
+        self.entry = path
+
+    def compile(self, checkpointer: Any = None) -> "StateGraph":
+        if self.entry is None:
+            raise ValueError("Graph has no entry point")
+        return self
+
+    async def astream(self, state: Any, config: Optional[Dict[str, Any]] = None, context: Any = None,
+                      stream_mode: Union[str, List[str]] = "updates") -> AsyncIterator[Any]:
+        """Run the graph step by step, yielding events for the requested stream modes"""
+        modes = [stream_mode] if isinstance(stream_mode, str) else list(stream_mode)
+        events: asyncio.Queue = asyncio.Queue()
+        runtime = Runtime(context=context, stream_writer=lambda chunk: events.put_nowait(("custom", chunk)))
+
+        values = self._as_dict(state)
+        active = self._targets(self.entry(state))
+
+        while active:
+            snapshot = self.state_schema(**values)
+            step = asyncio.gather(*(self._run_node(name, snapshot, runtime, events) for name in active))
+
+            # Forward events while the step's nodes are still running
+            while not step.done() or not events.empty():
+                getter = asyncio.ensure_future(events.get())
+                await asyncio.wait({getter, step}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                mode, chunk = getter.result()
+                if mode in modes:
+                    yield chunk if isinstance(stream_mode, str) else (mode, chunk)
+
+            next_nodes: List[str] = []
+            for update, goto in step.result():
+                for key, value in update.items():
+                    reducer = self.reducers.get(key)
+                    values[key] = reducer(values.get(key), value) if reducer else value
+                next_nodes += [name for name in goto if name not in next_nodes]
+            active = [name for name in next_nodes if name != END]
+
+    async def _run_node(self, name: str, state: Any, runtime: Runtime, events: asyncio.Queue):
+        """Run one node and normalise its result to (update, next nodes)"""
+        action = self.nodes[name]
+        kwargs = {"runtime": runtime} if "runtime" in inspect.signature(action).parameters else {}
+        result = action(state, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+
+        if isinstance(result, Command):
+            update, goto = result.update, result.goto
+        else:
+            update, goto = result or {}, self.edges.get(name, [])
+        events.put_nowait(("updates", {name: update}))
+        return update, goto
+
+    def _targets(self, route: Union[str, List[str]]) -> List[str]:
+        return [route] if isinstance(route, str) else list(route)
+
+    def _as_dict(self, state: Any) -> Dict[str, Any]:
+        if is_dataclass(state):
+            return {f.name: getattr(state, f.name) for f in fields(state)}
+        return dict(state)
@@ -7,17 +7,37 @@ machine learning models like Prophet and LSTM.
 
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta
+from collections import OrderedDict
+import copy
+import functools
+import hashlib
 import logging
-from sklearn.metrics import mean_absolute_error, mean_squared_error
+import threading
 import warnings
+import weakref
+from joblib import Parallel, delayed
 
 # Suppress warnings for cleaner output
 warnings.filterwarnings('ignore')
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of fitted models kept in the shared model cache
+MODEL_CACHE_SIZE = 64
+
+# Maximum number of drugs whose last Prophet parameters are kept for warm starts
+PROPHET_WARM_PARAMS_SIZE = 1024
+
+# Days of recent history used for Prophet in-sample accuracy metrics
+METRICS_WINDOW_DAYS = 90
+
+# Series shorter than this, or flatter than this coefficient of variation,
+# are forecast with the moving average baseline instead of Prophet/LSTM
+MIN_MODEL_HISTORY_DAYS = 30
+FLAT_SERIES_CV = 0.05
+
 try:
     from prophet import Prophet
     PROPHET_AVAILABLE = True
@@ -26,15 +46,61 @@ except ImportError:
     logger.warning("Prophet not available. Install with: pip install prophet")
 
 try:
+    import tensorflow as tf
     from tensorflow.keras.models import Sequential
     from tensorflow.keras.layers import LSTM, Dense, Dropout
-    from sklearn.preprocessing import MinMaxScaler
     TENSORFLOW_AVAILABLE = True
 except ImportError:
     TENSORFLOW_AVAILABLE = False
     logger.warning("TensorFlow not available. Install with: pip install tensorflow")
 
-from utils.database import get_sales_data, get_inventory_data
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logger.warning("Numba not available, using NumPy metrics. Install with: pip install numba")
+
+from utils.database import get_sales_data, get_sales_data_many, get_inventory_data
+
+@functools.lru_cache(maxsize=None)
+def _configure_tensorflow_devices():
+    """
+    Apply the mixed precision policy on GPU hosts, once, on the first model build
+
+    Listing GPUs initializes the CUDA runtime, so this must not run at import:
+    under gunicorn's preload_app the master would create a CUDA context that
+    forked workers inherit but cannot use.
+    """
+    # Mixed precision only pays off on GPUs with tensor cores
+    if tf.config.list_physical_devices('GPU'):
+        tf.keras.mixed_precision.set_global_policy('mixed_float16')
+
+def _metrics_kernel(actual: np.ndarray, predicted: np.ndarray) -> Tuple[float, float, float]:
+    """
+    Fused single-pass MAE/RMSE/MAPE kernel
+
+    Returns (mae, rmse, mape); mape is -1.0 when every actual value is zero.
+    """
+    n = actual.shape[0]
+    sum_abs_err = 0.0
+    sum_sq_err = 0.0
+    sum_abs_pct_err = 0.0
+    non_zero = 0
+    for i in range(n):
+        err = actual[i] - predicted[i]
+        sum_abs_err += abs(err)
+        sum_sq_err += err * err
+        if actual[i] != 0.0:
+            sum_abs_pct_err += abs(err) / abs(actual[i])
+            non_zero += 1
+    mape = sum_abs_pct_err / non_zero * 100.0 if non_zero else -1.0
+    return sum_abs_err / n, (sum_sq_err / n) ** 0.5, mape
+
+if NUMBA_AVAILABLE:
+    _metrics_kernel = njit(cache=True, fastmath=True)(_metrics_kernel)
+    # Compile at import so the first forecast request does not pay for it
+    _metrics_kernel(np.ones(2), np.ones(2))
 
 class ForecastingAgent:
     """
@@ -43,19 +109,36 @@ class ForecastingAgent:
     Supports multiple forecasting models:
     - Prophet (Facebook's forecasting library)
     - LSTM (Deep Learning approach)
+    - Direct multi-output LSTM (whole horizon in one forward pass)
     - Simple moving average (baseline)
     """
 
+    # Fitted models shared across agent instances (LRU), keyed by model name
+    # and a digest of the training series
+    _model_cache: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+    _model_cache_lock = threading.Lock()
+
+    # Last fitted Prophet parameters per drug (LRU), used to warm-start the
+    # next fit; guarded by _model_cache_lock
+    _prophet_warm_params: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    # Compiled recursive forecast per trained LSTM model, dropped with the model
+    _lstm_rollers: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+    _lstm_rollers_lock = threading.Lock()
+
     def __init__(self):
         self.models = {
             'prophet': self._forecast_prophet,
             'lstm': self._forecast_lstm,
+            'lstm_direct': self._forecast_lstm_direct,
             'moving_average': self._forecast_moving_average
         }
 
     def forecast(self, drug_id: str, branch_id: Optional[str] = None,
                 horizon_days: int = 30, model: str = 'prophet',
-                sales_data: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+                sales_data: Optional[List[Dict[str, Any]]] = None,
+                force_model: bool = False, uncertainty_samples: int = 100,
+                cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
         Forecast demand for a pharmaceutical product
 
@@ -63,43 +146,164 @@ class ForecastingAgent:
             drug_id: ID of the drug to forecast
             branch_id: Optional branch ID for location-specific forecast
             horizon_days: Number of days to forecast
-            model: Forecasting model to use ('prophet', 'lstm', 'moving_average')
+            model: Forecasting model to use ('prophet', 'lstm', 'lstm_direct', 'moving_average')
+            force_model: Run the requested model even for short or flat series
+            uncertainty_samples: Prophet posterior draws for interval bounds (0 disables)
+            cancel_event: Set by the caller to abandon the forecast, checked
+                before the data is prepared and before the model is fitted
 
         Returns:
             Dictionary containing forecast results, metrics, and confidence intervals
         """
         try:
-            logger.info(f"Starting forecast for drug {drug_id}, model: {model}, horizon: {horizon_days} days")
+            logger.info("Starting forecast for drug %s, model: %s, horizon: %s days", drug_id, model, horizon_days)
 
             # Get historical sales data
             if sales_data is None:
                 sales_data = get_sales_data(drug_id, branch_id, days=365)
 
             if not sales_data:
-                logger.warning(f"No sales data found for drug {drug_id}")
+                logger.warning("No sales data found for drug %s", drug_id)
                 return self._empty_forecast_response(horizon_days)
 
+            if cancel_event is not None and cancel_event.is_set():
+                return self._cancelled_response(drug_id, horizon_days)
+
             # Convert to DataFrame
             df = self._prepare_data(sales_data)
 
             if df.empty or len(df) < 7:  # Need at least a week of data
-                logger.warning(f"Insufficient data for drug {drug_id}: {len(df)} records")
+                logger.warning("Insufficient data for drug %s: %s records", drug_id, len(df))
                 return self._empty_forecast_response(horizon_days)
 
+            if cancel_event is not None and cancel_event.is_set():
+                return self._cancelled_response(drug_id, horizon_days)
+
             # Select and run forecasting model
             if model not in self.models:
-                logger.warning(f"Unknown model {model}, using prophet")
+                logger.warning("Unknown model %s, using prophet", model)
                 model = 'prophet'
 
-            forecast_result = self.models[model](df, horizon_days)
+            if not force_model and model != 'moving_average' and self._should_use_baseline(df):
+                logger.info("Short or flat series for drug %s, using moving_average instead of %s", drug_id, model)
+                model = 'moving_average'
+
+            if model == 'prophet':
+                forecast_result = self._forecast_prophet(df, horizon_days, drug_id=drug_id,
+                                                         uncertainty_samples=uncertainty_samples)
+            else:
+                forecast_result = self.models[model](df, horizon_days)
 
-            logger.info(f"Forecast completed for drug {drug_id}")
+            logger.info("Forecast completed for drug %s", drug_id)
             return forecast_result
 
         except Exception as e:
-            logger.error(f"Error in forecasting for drug {drug_id}: {e}")
+            logger.error("Error in forecasting for drug %s: %s", drug_id, e)
             return self._error_response(str(e), horizon_days)
 
+    def forecast_many(self, drug_ids: List[str], branch_id: Optional[str] = None,
+                      horizon_days: int = 30, model: str = 'prophet',
+                      force_model: bool = False,
+                      uncertainty_samples: int = 100) -> Dict[str, Dict[str, Any]]:
+        """
+        Forecast demand for several pharmaceutical products in one pass
+
+        Sales history for all drugs is fetched with a single query. Prophet
+        fits run in parallel worker processes and LSTM trains one shared
+        model whose forecasts are produced as a single batch.
+
+        Args:
+            drug_ids: IDs of the drugs to forecast
+            branch_id: Optional branch ID for location-specific forecast
+            horizon_days: Number of days to forecast
+            model: Forecasting model to use ('prophet', 'lstm', 'lstm_direct', 'moving_average')
+            force_model: Run the requested model even for short or flat series
+            uncertainty_samples: Prophet posterior draws for interval bounds (0 disables)
+
+        Returns:
+            Dictionary mapping each drug ID to its forecast result
+        """
+        try:
+            logger.info("Starting batch forecast for %s drugs, model: %s, horizon: %s days", len(drug_ids), model, horizon_days)
+
+            if model not in self.models:
+                logger.warning("Unknown model %s, using prophet", model)
+                model = 'prophet'
+
+            sales_by_drug = get_sales_data_many(drug_ids, branch_id, days=365)
+
+            results: Dict[str, Dict[str, Any]] = {}
+            prepared: Dict[str, pd.DataFrame] = {}
+            for drug_id in drug_ids:
+                sales_data = sales_by_drug.get(drug_id)
+                if not sales_data:
+                    logger.warning("No sales data found for drug %s", drug_id)
+                    results[drug_id] = self._empty_forecast_response(horizon_days)
+                    continue
+
+                df = self._prepare_data(sales_data)
+                if df.empty or len(df) < 7:  # Need at least a week of data
+                    logger.warning("Insufficient data for drug %s: %s records", drug_id, len(df))
+                    results[drug_id] = self._empty_forecast_response(horizon_days)
+                    continue
+
+                if not force_model and model != 'moving_average' and self._should_use_baseline(df):
+                    logger.info("Short or flat series for drug %s, using moving_average instead of %s", drug_id, model)
+                    results[drug_id] = self._forecast_moving_average(df, horizon_days)
+                    continue
+
+                prepared[drug_id] = df
+
+            if prepared:
+                if model == 'prophet':
+                    results.update(self._forecast_prophet_many(prepared, horizon_days, uncertainty_samples))
+                elif model == 'lstm':
+                    results.update(self._forecast_lstm_many(prepared, horizon_days))
+                else:
+                    for drug_id, df in prepared.items():
+                        results[drug_id] = self.models[model](df, horizon_days)
+
+            logger.info("Batch forecast completed for %s drugs", len(drug_ids))
+            return {drug_id: results[drug_id] for drug_id in drug_ids}
+
+        except Exception as e:
+            logger.error("Error in batch forecasting: %s", e)
+            return {drug_id: self._error_response(str(e), horizon_days) for drug_id in drug_ids}
+
+    def _forecast_prophet_many(self, dfs: Dict[str, pd.DataFrame], horizon_days: int,
+                               uncertainty_samples: int) -> Dict[str, Dict[str, Any]]:
+        """Forecast several series with Prophet, fitting in parallel worker processes"""
+        if not PROPHET_AVAILABLE:
+            logger.error("Prophet not available")
+            return {drug_id: self._error_response("Prophet not installed", horizon_days) for drug_id in dfs}
+
+        # Workers get a copy of the agent without this process's caches, so
+        # cached models and warm-start parameters are looked up here and the
+        # models they fit are brought back and stored here
+        jobs = [
+            (drug_id, self._model_cache_key('prophet', df), df)
+            for drug_id, df in dfs.items()
+        ]
+        outputs = Parallel(n_jobs=-1 if len(jobs) > 1 else 1, backend='loky')(
+            delayed(self._run_prophet)(df, horizon_days, self._get_cached_model(cache_key),
+                                       self._get_warm_params(drug_id), uncertainty_samples)
+            for drug_id, cache_key, df in jobs
+        )
+
+        results = {}
+        for (drug_id, cache_key, _), (response, fitted) in zip(jobs, outputs):
+            self._store_prophet_fit(cache_key, drug_id, fitted)
+            results[drug_id] = response
+        return results
+
+    def _should_use_baseline(self, df: pd.DataFrame) -> bool:
+        """Whether a series is too short or too flat to be worth fitting a model"""
+        y = df['y'].to_numpy()
+        if len(y) < MIN_MODEL_HISTORY_DAYS:
+            return True
+        mean = y.mean()
+        return bool(mean > 0 and y.std() / mean < FLAT_SERIES_CV)
+
     def _prepare_data(self, sales_data: List[Dict[str, Any]]) -> pd.DataFrame:
         """Prepare sales data for forecasting"""
         try:
@@ -109,70 +313,97 @@ class ForecastingAgent:
             # Ensure date column is datetime
             df['date'] = pd.to_datetime(df['date'])
 
-            # Group by date and sum quantities (in case of multiple entries per day)
-            df_daily = df.groupby('date')['quantity'].sum().reset_index()
-
-            # Sort by date
-            df_daily = df_daily.sort_values('date')
-
-            # Rename columns for Prophet compatibility
-            df_daily = df_daily.rename(columns={'date': 'ds', 'quantity': 'y'})
-
-            # Ensure no missing dates (fill with 0)
-            date_range = pd.date_range(start=df_daily['ds'].min(),
-                                      end=df_daily['ds'].max(),
-                                      freq='D')
-            df_daily = df_daily.set_index('ds').reindex(date_range, fill_value=0).reset_index()
-            df_daily = df_daily.rename(columns={'index': 'ds'})
+            # Bucket quantities into a dense daily series in one pass: day offsets
+            # from the first date index into bincount, so duplicate days are summed
+            # and missing days come out as 0
+            dates = df['date'].values.astype('datetime64[D]')
+            quantities = df['quantity'].to_numpy(dtype=np.float64)
+            day0 = dates.min()
+            offsets = (dates - day0).astype(np.int64)
+            n_days = int(offsets.max()) + 1
+            daily_quantity = np.bincount(offsets, weights=quantities, minlength=n_days)
+
+            # Column names follow Prophet's ds/y convention
+            df_daily = pd.DataFrame({
+                'ds': pd.to_datetime(day0 + np.arange(n_days, dtype='timedelta64[D]')),
+                'y': daily_quantity
+            })
 
             return df_daily
 
         except Exception as e:
-            logger.error(f"Error preparing data: {e}")
+            logger.error("Error preparing data: %s", e)
             return pd.DataFrame()
 
-    def _forecast_prophet(self, df: pd.DataFrame, horizon_days: int) -> Dict[str, Any]:
-        """Forecast using Facebook Prophet"""
+    def _forecast_prophet(self, df: pd.DataFrame, horizon_days: int,
+                          drug_id: Optional[str] = None,
+                          uncertainty_samples: int = 100) -> Dict[str, Any]:
+        """
+        Forecast using Facebook Prophet (warm-started from the drug's last fit)
+
+        uncertainty_samples controls the posterior draws used for the interval
+        bounds; 0 skips sampling and uses a fixed +/-10% band around yhat.
+        """
         if not PROPHET_AVAILABLE:
             logger.error("Prophet not available")
             return self._error_response("Prophet not installed", horizon_days)
 
-        try:
-            # Initialize Prophet model
-            model = Prophet(
-                yearly_seasonality=True,
-                weekly_seasonality=True,
-                daily_seasonality=False,
-                seasonality_mode='additive',
-                changepoint_prior_scale=0.05,
-                interval_width=0.95
-            )
+        # Reuse a model already fitted on identical data
+        cache_key = self._model_cache_key('prophet', df)
+        model = self._get_cached_model(cache_key)
+        warm_params = self._get_warm_params(drug_id)
+
+        response, fitted = self._run_prophet(df, horizon_days, model, warm_params, uncertainty_samples)
+        self._store_prophet_fit(cache_key, drug_id, fitted)
+        return response
+
+    def _run_prophet(self, df: pd.DataFrame, horizon_days: int, model: Optional[Any],
+                     warm_params: Optional[Dict[str, Any]],
+                     uncertainty_samples: int) -> Tuple[Dict[str, Any], Optional[Any]]:
+        """
+        Fit (unless a fitted model is given) and predict with Prophet
 
-            # Fit model
-            model.fit(df)
+        Touches no shared state, so it can run in a worker process. Returns
+        (response, newly fitted model or None) for the caller to cache.
+        """
+        try:
+            fitted = None
+            if model is None:
+                model = fitted = self._fit_prophet(df, warm_params)
 
             # Create future dates
             future = model.make_future_dataframe(periods=horizon_days, freq='D')
 
-            # Forecast
-            forecast = model.predict(future)
+            # Forecast (sampling cost is set per call, cached models included).
+            # Cached models are shared across request threads, so the setting
+            # goes on a shallow copy rather than the shared model
+            predictor = copy.copy(model)
+            predictor.uncertainty_samples = uncertainty_samples
+            forecast = predictor.predict(future)
+
+            if not uncertainty_samples:
+                forecast['yhat_lower'] = forecast['yhat'] * 0.9
+                forecast['yhat_upper'] = forecast['yhat'] * 1.1
 
             # Extract forecast for future period only
             last_date = df['ds'].max()
             future_forecast = forecast[forecast['ds'] > last_date].copy()
 
-            # Prepare response
-            forecast_data = []
-            for _, row in future_forecast.iterrows():
-                forecast_data.append({
-                    'date': row['ds'].strftime('%Y-%m-%d'),
-                    'yhat': float(row['yhat']),
-                    'yhat_lower': float(row['yhat_lower']),
-                    'yhat_upper': float(row['yhat_upper'])
-                })
+            # Prepare response (columnar, no per-row Series boxing)
+            forecast_data = (
+                future_forecast[['yhat', 'yhat_lower', 'yhat_upper']]
+                .astype(float)
+                .assign(date=future_forecast['ds'].dt.strftime('%Y-%m-%d'))
+                [['date', 'yhat', 'yhat_lower', 'yhat_upper']]
+                .to_dict('records')
+            )
 
-            # Calculate metrics using historical data
-            metrics = self._calculate_metrics(df, forecast[forecast['ds'] <= last_date])
+            # Calculate metrics on the recent history window only
+            cutoff = last_date - pd.Timedelta(days=METRICS_WINDOW_DAYS)
+            metrics = self._calculate_metrics(
+                df[df['ds'] >= cutoff],
+                forecast[(forecast['ds'] >= cutoff) & (forecast['ds'] <= last_date)]
+            )
 
             return {
                 'forecast': forecast_data,
@@ -183,11 +414,72 @@ class ForecastingAgent:
                 },
                 'model': 'prophet',
                 'status': 'success'
-            }
+            }, fitted
 
         except Exception as e:
-            logger.error(f"Error in Prophet forecasting: {e}")
-            return self._error_response(f"Prophet error: {str(e)}", horizon_days)
+            logger.error("Error in Prophet forecasting: %s", e)
+            return self._error_response(f"Prophet error: {str(e)}", horizon_days), None
+
+    def _store_prophet_fit(self, cache_key: Tuple[str, str], drug_id: Optional[str], model: Optional[Any]):
+        """Cache a newly fitted Prophet model and keep its parameters for the drug's next warm start"""
+        if model is None:
+            return
+        self._set_cached_model(cache_key, model)
+        if drug_id:
+            params = self._prophet_init_params(model)
+            with self._model_cache_lock:
+                self._prophet_warm_params[drug_id] = params
+                self._prophet_warm_params.move_to_end(drug_id)
+                while len(self._prophet_warm_params) > PROPHET_WARM_PARAMS_SIZE:
+                    self._prophet_warm_params.popitem(last=False)
+
+    def _get_warm_params(self, drug_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Get a drug's last Prophet parameters, marking them recently used"""
+        if not drug_id:
+            return None
+        with self._model_cache_lock:
+            params = self._prophet_warm_params.get(drug_id)
+            if params is not None:
+                self._prophet_warm_params.move_to_end(drug_id)
+            return params
+
+    def _fit_prophet(self, df: pd.DataFrame, warm_params: Optional[Dict[str, Any]] = None):
+        """
+        Fit a Prophet model, starting the optimizer from warm_params if given
+
+        Warm starting from the drug's previous fit converges in a few
+        iterations. The number of changepoints grows with the history length,
+        so an init from a shorter series can be rejected; the fit is then
+        retried from scratch on a fresh model (Prophet models fit only once).
+        """
+        if warm_params:
+            model = self._new_prophet()
+            try:
+                model.fit(df, init=warm_params)
+                return model
+            except Exception as e:
+                logger.info("Prophet warm start rejected, fitting from scratch: %s", e)
+
+        model = self._new_prophet()
+        model.fit(df)
+        return model
+
+    def _new_prophet(self):
+        """Create an unfitted Prophet model with the agent's settings"""
+        return Prophet(
+            yearly_seasonality=True,
+            weekly_seasonality=True,
+            daily_seasonality=False,
+            seasonality_mode='additive',
+            changepoint_prior_scale=0.05,
+            interval_width=0.95
+        )
+
+    def _prophet_init_params(self, model) -> Dict[str, Any]:
+        """Extract fitted Prophet parameters in the form accepted by fit(init=...)"""
+        params = {pname: model.params[pname][0][0] for pname in ('k', 'm', 'sigma_obs')}
+        params.update({pname: model.params[pname][0] for pname in ('delta', 'beta')})
+        return params
 
     def _forecast_lstm(self, df: pd.DataFrame, horizon_days: int) -> Dict[str, Any]:
         """Forecast using LSTM neural network"""
@@ -196,91 +488,286 @@ class ForecastingAgent:
             return self._error_response("TensorFlow not installed", horizon_days)
 
         try:
-            # Prepare data for LSTM
-            data = df['y'].values.reshape(-1, 1)
-
-            # Normalize data
-            scaler = MinMaxScaler(feature_range=(0, 1))
-            scaled_data = scaler.fit_transform(data)
+            # Prepare and normalize data for LSTM
+            scaled_data, data_min, data_range = self._min_max_scale(df['y'].to_numpy(dtype=np.float32))
 
             # Create sequences
             sequence_length = min(30, len(scaled_data) - 1)  # Use up to 30 days of history
-            X, y = [], []
+            X, y = self._make_lstm_sequences(scaled_data, sequence_length)
 
-            for i in range(sequence_length, len(scaled_data)):
-                X.append(scaled_data[i-sequence_length:i, 0])
-                y.append(scaled_data[i, 0])
+            # Scaling is deterministic, so a cached model only needs the weights
+            cache_key = self._model_cache_key('lstm', df)
+            model = self._get_cached_model(cache_key)
 
-            X, y = np.array(X), np.array(y)
-            X = np.reshape(X, (X.shape[0], X.shape[1], 1))
+            if model is None:
+                if len(X) < 5:  # Need minimum training data
+                    return self._forecast_moving_average(df, horizon_days)
 
-            if len(X) < 5:  # Need minimum training data
-                return self._forecast_moving_average(df, horizon_days)
+                # Build and train LSTM model (quick training for demo)
+                model = self._build_lstm_model(sequence_length)
+                model.fit(X, y, epochs=10, batch_size=16, verbose=0)
+                self._set_cached_model(cache_key, model)
 
-            # Build LSTM model
-            model = Sequential([
-                LSTM(50, return_sequences=True, input_shape=(X.shape[1], 1)),
-                Dropout(0.2),
-                LSTM(50, return_sequences=False),
-                Dropout(0.2),
-                Dense(1)
-            ])
+            # In-sample reconstruction for basic metrics
+            train_pred = model(X, training=False).numpy().flatten() * data_range + data_min
+            train_actual = y * data_range + data_min
+            lstm_metrics = self._compute_basic_metrics(train_actual, train_pred)
 
-            model.compile(optimizer='adam', loss='mean_squared_error')
+            # Forecast future values (whole recursive horizon in one graph call)
+            last_sequence = scaled_data[-sequence_length:].reshape(1, -1)
+            predicted_scaled = self._roll_lstm_forecast(model, last_sequence, horizon_days)
+            predicted_values = predicted_scaled.flatten() * data_range + data_min
 
-            # Train model (quick training for demo)
-            model.fit(X, y, epochs=10, batch_size=16, verbose=0)
+            return self._lstm_response(df, predicted_values, lstm_metrics)
 
-            # In-sample reconstruction for basic metrics
-            train_pred_scaled = model.predict(X, verbose=0).flatten()
-            train_pred = scaler.inverse_transform(train_pred_scaled.reshape(-1, 1)).flatten()
-            train_actual = scaler.inverse_transform(y.reshape(-1, 1)).flatten()
-            lstm_metrics = self._compute_basic_metrics(train_actual, train_pred)
+        except Exception as e:
+            logger.error("Error in LSTM forecasting: %s", e)
+            return self._error_response(f"LSTM error: {str(e)}", horizon_days)
+
+    def _forecast_lstm_direct(self, df: pd.DataFrame, horizon_days: int) -> Dict[str, Any]:
+        """
+        Forecast using a multi-output LSTM that emits the whole horizon at once
+
+        The network is trained on (window, next horizon_days values) pairs so a
+        single forward pass replaces the recursive rollout. Falls back to the
+        recursive LSTM when the history is too short for horizon-length targets.
+        """
+        if not TENSORFLOW_AVAILABLE:
+            logger.error("TensorFlow not available")
+            return self._error_response("TensorFlow not installed", horizon_days)
 
-            # Forecast future values
-            forecast_data = []
-            last_sequence = scaled_data[-sequence_length:].flatten()
+        try:
+            scaled_data, data_min, data_range = self._min_max_scale(df['y'].to_numpy(dtype=np.float32))
 
-            for i in range(horizon_days):
-                # Prepare input
-                input_seq = last_sequence[-sequence_length:].reshape(1, sequence_length, 1)
+            sequence_length = min(30, len(scaled_data) - horizon_days)
+            if sequence_length < 1 or len(scaled_data) - sequence_length - horizon_days + 1 < 5:
+                return self._forecast_lstm(df, horizon_days)
 
-                # Predict next value
-                predicted_scaled = model.predict(input_seq, verbose=0)[0][0]
+            # Each row holds an input window followed by its horizon-length target
+            windows = sliding_window_view(scaled_data, sequence_length + horizon_days)
+            X = windows[:, :sequence_length, np.newaxis]
+            y = windows[:, sequence_length:]
 
-                # Inverse transform
-                predicted_value = scaler.inverse_transform([[predicted_scaled]])[0][0]
+            cache_key = self._model_cache_key(f'lstm_direct:{horizon_days}', df)
+            model = self._get_cached_model(cache_key)
 
-                # Ensure non-negative
-                predicted_value = max(0, predicted_value)
+            if model is None:
+                model = self._build_lstm_model(sequence_length, outputs=horizon_days)
+                model.fit(X, y, epochs=10, batch_size=16, verbose=0)
+                self._set_cached_model(cache_key, model)
 
-                # Add to forecast
-                forecast_date = df['ds'].max() + timedelta(days=i+1)
-                forecast_data.append({
-                    'date': forecast_date.strftime('%Y-%m-%d'),
-                    'yhat': float(predicted_value),
-                    'yhat_lower': float(predicted_value * 0.8),  # Simple confidence interval
-                    'yhat_upper': float(predicted_value * 1.2)
-                })
+            # In-sample multi-step reconstruction for basic metrics
+            train_pred = model(X, training=False).numpy().ravel() * data_range + data_min
+            train_actual = y.ravel() * data_range + data_min
+            metrics = self._compute_basic_metrics(train_actual, train_pred)
 
-                # Update sequence for next prediction
-                last_sequence = np.append(last_sequence, predicted_scaled)
+            last_sequence = scaled_data[-sequence_length:].reshape(1, sequence_length, 1)
+            predicted_values = model(last_sequence, training=False).numpy().ravel() * data_range + data_min
 
-            return {
-                'forecast': forecast_data,
-                'metrics': lstm_metrics,
-                'confidence_interval': {
-                    'lower': float(np.mean([f['yhat_lower'] for f in forecast_data])),
-                    'upper': float(np.mean([f['yhat_upper'] for f in forecast_data]))
-                },
-                'model': 'lstm',
-                'status': 'success'
-            }
+            return self._lstm_response(df, predicted_values, metrics, model_name='lstm_direct')
 
         except Exception as e:
-            logger.error(f"Error in LSTM forecasting: {e}")
+            logger.error("Error in direct LSTM forecasting: %s", e)
             return self._error_response(f"LSTM error: {str(e)}", horizon_days)
 
+    def _forecast_lstm_many(self, dfs: Dict[str, pd.DataFrame],
+                            horizon_days: int) -> Dict[str, Dict[str, Any]]:
+        """Train one shared LSTM over several series and forecast them as one batch"""
+        if not TENSORFLOW_AVAILABLE:
+            logger.error("TensorFlow not available")
+            return {drug_id: self._error_response("TensorFlow not installed", horizon_days)
+                    for drug_id in dfs}
+
+        try:
+            # A shared model needs a common window length across all series
+            sequence_length = min(30, min(len(df) for df in dfs.values()) - 1)
+
+            scaling, last_sequences, X_parts, y_parts = [], [], [], []
+            for df in dfs.values():
+                scaled_data, data_min, data_range = self._min_max_scale(df['y'].to_numpy(dtype=np.float32))
+                X, y = self._make_lstm_sequences(scaled_data, sequence_length)
+                scaling.append((data_min, data_range))
+                last_sequences.append(scaled_data[-sequence_length:])
+                X_parts.append(X)
+                y_parts.append(y)
+
+            X_all = np.concatenate(X_parts)
+            y_all = np.concatenate(y_parts)
+
+            if len(X_all) < 5:  # Need minimum training data
+                return {drug_id: self._forecast_moving_average(df, horizon_days)
+                        for drug_id, df in dfs.items()}
+
+            model = self._build_lstm_model(sequence_length)
+            model.fit(X_all, y_all, epochs=10, batch_size=16, verbose=0)
+
+            # One in-sample pass and one batched horizon roll for every drug
+            train_pred_all = model(X_all, training=False).numpy().flatten()
+            predicted_all = self._roll_lstm_forecast(model, np.stack(last_sequences), horizon_days)
+
+            results = {}
+            offset = 0
+            for column, (drug_id, df) in enumerate(dfs.items()):
+                data_min, data_range = scaling[column]
+                n_windows = len(y_parts[column])
+                train_pred = train_pred_all[offset:offset + n_windows] * data_range + data_min
+                train_actual = y_parts[column] * data_range + data_min
+                offset += n_windows
+
+                predicted_values = predicted_all[:, column] * data_range + data_min
+                results[drug_id] = self._lstm_response(
+                    df, predicted_values, self._compute_basic_metrics(train_actual, train_pred))
+
+            return results
+
+        except Exception as e:
+            logger.error("Error in batched LSTM forecasting: %s", e)
+            return {drug_id: self._error_response(f"LSTM error: {str(e)}", horizon_days)
+                    for drug_id in dfs}
+
+    def _min_max_scale(self, values: np.ndarray) -> Tuple[np.ndarray, float, float]:
+        """
+        Scale a series to [0, 1]
+
+        Returns (scaled, data_min, data_range); invert with
+        scaled * data_range + data_min. A constant series gets range 1.
+        """
+        data_min = float(values.min())
+        data_range = float(values.max() - data_min) or 1.0
+        return ((values - data_min) / data_range).astype(np.float32), data_min, data_range
+
+    def _make_lstm_sequences(self, scaled_data: np.ndarray,
+                             sequence_length: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Build (window, next value) training pairs from a scaled series"""
+        # Strided view over the series: no per-window copies; the last window
+        # has no next value so it is dropped
+        X = sliding_window_view(scaled_data, sequence_length)[:-1]
+        y = scaled_data[sequence_length:]
+        return X[..., np.newaxis], y
+
+    def _build_lstm_model(self, sequence_length: int, outputs: int = 1):
+        """Build and compile the LSTM network with the given number of output steps"""
+        _configure_tensorflow_devices()
+        model = Sequential([
+            LSTM(50, return_sequences=True, input_shape=(sequence_length, 1)),
+            Dropout(0.2),
+            LSTM(50, return_sequences=False),
+            Dropout(0.2),
+            Dense(outputs, dtype='float32')  # Keep outputs float32 under mixed precision
+        ])
+
+        model.compile(optimizer='adam', loss='mean_squared_error')
+        return model
+
+    def _roll_lstm_forecast(self, model, last_sequences: np.ndarray, steps: int) -> np.ndarray:
+        """
+        Run the recursive LSTM forecast for all steps inside a single TF graph call
+
+        Args:
+            model: Trained LSTM model
+            last_sequences: Scaled input windows, shape (batch, sequence_length)
+            steps: Number of steps to roll forward
+
+        Returns:
+            Scaled predictions with shape (steps, batch)
+        """
+        roll_forecast = self._get_lstm_roller(model)
+        window = tf.constant(last_sequences[..., np.newaxis], dtype=tf.float32)
+        return roll_forecast(window, tf.constant(steps, dtype=tf.int32)).numpy()
+
+    def _get_lstm_roller(self, model):
+        """Get the compiled recursive forecast for a model, building it on first use"""
+        with self._lstm_rollers_lock:
+            roll_forecast = self._lstm_rollers.get(model)
+            if roll_forecast is None:
+                roll_forecast = self._build_lstm_roller(model)
+                self._lstm_rollers[model] = roll_forecast
+            return roll_forecast
+
+    @staticmethod
+    def _build_lstm_roller(model):
+        """
+        Build the recursive forecast graph for one model
+
+        The input signature leaves batch size and step count dynamic, so every
+        horizon and batch reuses the same trace instead of retracing per call.
+        """
+        # Weak reference: the cached function must not keep its own key alive
+        model_ref = weakref.ref(model)
+        sequence_length = model.input_shape[1]
+
+        @tf.function(jit_compile=True, input_signature=[
+            tf.TensorSpec([None, sequence_length, 1], tf.float32),
+            tf.TensorSpec([], tf.int32),
+        ])
+        def roll_forecast(window, n_steps):
+            step_model = model_ref()
+            predictions = tf.TensorArray(tf.float32, size=n_steps)
+            for i in tf.range(n_steps):
+                next_value = step_model(window, training=False)
+                predictions = predictions.write(i, next_value[:, 0])
+                # Slide the window: drop the oldest step, append the prediction
+                window = tf.concat([window[:, 1:, :], tf.reshape(next_value, (-1, 1, 1))], axis=1)
+            return predictions.stack()
+
+        return roll_forecast
+
+    def _lstm_response(self, df: pd.DataFrame, predicted_values: np.ndarray,
+                       metrics: Dict[str, Optional[float]], model_name: str = 'lstm') -> Dict[str, Any]:
+        """Build the forecast response for LSTM predictions"""
+        # Ensure non-negative
+        predicted_values = np.maximum(predicted_values, 0)
+
+        # Simple confidence interval
+        forecast_data = self._forecast_points(df['ds'].max(), predicted_values,
+                                              predicted_values * 0.8, predicted_values * 1.2)
+
+        return {
+            'forecast': forecast_data,
+            'metrics': metrics,
+            'confidence_interval': {
+                'lower': float(np.mean(predicted_values) * 0.8),
+                'upper': float(np.mean(predicted_values) * 1.2)
+            },
+            'model': model_name,
+            'status': 'success'
+        }
+
+    def _forecast_points(self, last_date: pd.Timestamp, yhat: np.ndarray,
+                         yhat_lower: np.ndarray, yhat_upper: np.ndarray) -> List[Dict[str, Any]]:
+        """Build daily forecast points following last_date from columnar arrays"""
+        # Dates and values are converted once per column, not once per row
+        first_day = np.datetime64(last_date, 'D') + 1
+        dates = np.datetime_as_string(first_day + np.arange(len(yhat)), unit='D').tolist()
+        return [
+            {'date': date, 'yhat': value, 'yhat_lower': lower, 'yhat_upper': upper}
+            for date, value, lower, upper in zip(dates, yhat.tolist(), yhat_lower.tolist(), yhat_upper.tolist())
+        ]
+
+    def _model_cache_key(self, model_name: str, df: pd.DataFrame) -> Tuple[str, str]:
+        """Build the model cache key from the model name and a digest of the series"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(df['ds'].to_numpy().tobytes())
+        digest.update(df['y'].to_numpy().tobytes())
+        return model_name, digest.hexdigest()
+
+    def _get_cached_model(self, cache_key: Tuple[str, str]) -> Optional[Any]:
+        """Get a fitted model from the shared cache, marking it recently used"""
+        with self._model_cache_lock:
+            fitted = self._model_cache.get(cache_key)
+            if fitted is not None:
+                self._model_cache.move_to_end(cache_key)
+                logger.info("Model cache hit for %s", cache_key[0])
+            return fitted
+
+    def _set_cached_model(self, cache_key: Tuple[str, str], fitted: Any):
+        """Store a fitted model, evicting the least recently used entries"""
+        with self._model_cache_lock:
+            self._model_cache[cache_key] = fitted
+            self._model_cache.move_to_end(cache_key)
+            while len(self._model_cache) > MODEL_CACHE_SIZE:
+                self._model_cache.popitem(last=False)
+
     def _forecast_moving_average(self, df: pd.DataFrame, horizon_days: int) -> Dict[str, Any]:
         """Simple moving average forecast (baseline)"""
         try:
@@ -293,15 +780,8 @@ class ForecastingAgent:
             recent_pred = np.full_like(recent_actual, avg_value, dtype=float)
             metrics = self._compute_basic_metrics(recent_actual, recent_pred)
 
-            forecast_data = []
-            for i in range(horizon_days):
-                forecast_date = df['ds'].max() + timedelta(days=i+1)
-                forecast_data.append({
-                    'date': forecast_date.strftime('%Y-%m-%d'),
-                    'yhat': float(avg_value),
-                    'yhat_lower': float(avg_value * 0.7),
-                    'yhat_upper': float(avg_value * 1.3)
-                })
+            yhat = np.full(horizon_days, avg_value, dtype=float)
+            forecast_data = self._forecast_points(df['ds'].max(), yhat, yhat * 0.7, yhat * 1.3)
 
             return {
                 'forecast': forecast_data,
@@ -315,7 +795,7 @@ class ForecastingAgent:
             }
 
         except Exception as e:
-            logger.error(f"Error in moving average forecasting: {e}")
+            logger.error("Error in moving average forecasting: %s", e)
             return self._error_response(f"Moving average error: {str(e)}", horizon_days)
 
     def _calculate_metrics(self, actual_df: pd.DataFrame, forecast_df: pd.DataFrame) -> Dict[str, float]:
@@ -328,28 +808,10 @@ class ForecastingAgent:
             if len(merged) < 2:
                 return {'mape': None, 'rmse': None, 'mae': None}
 
-            actual = merged['y'].values
-            predicted = merged['yhat'].values
-
-            # Calculate metrics
-            mae = mean_absolute_error(actual, predicted)
-            rmse = np.sqrt(mean_squared_error(actual, predicted))
-
-            # MAPE (avoid division by zero)
-            non_zero_mask = actual != 0
-            if np.any(non_zero_mask):
-                mape = np.mean(np.abs((actual[non_zero_mask] - predicted[non_zero_mask]) / actual[non_zero_mask])) * 100
-            else:
-                mape = None
-
-            return {
-                'mape': float(mape) if mape is not None else None,
-                'rmse': float(rmse),
-                'mae': float(mae)
-            }
+            return self._compute_basic_metrics(merged['y'].values, merged['yhat'].values)
 
         except Exception as e:
-            logger.error(f"Error calculating metrics: {e}")
+            logger.error("Error calculating metrics: %s", e)
             return {'mape': None, 'rmse': None, 'mae': None}
 
     def _empty_forecast_response(self, horizon_days: int) -> Dict[str, Any]:
@@ -374,20 +836,37 @@ class ForecastingAgent:
             'message': error_msg
         }
 
+    def _cancelled_response(self, drug_id: str, horizon_days: int) -> Dict[str, Any]:
+        """Return the response for a forecast abandoned by its caller"""
+        logger.info("Forecast for drug %s cancelled", drug_id)
+        return self._error_response("Forecast cancelled", horizon_days)
+
     def _compute_basic_metrics(self, actual: np.ndarray, predicted: np.ndarray) -> Dict[str, Optional[float]]:
         """Compute MAE, RMSE, MAPE for given arrays"""
         try:
             if len(actual) == 0:
                 return {'mape': None, 'rmse': None, 'mae': None}
 
-            mae = mean_absolute_error(actual, predicted)
-            rmse = np.sqrt(mean_squared_error(actual, predicted))
-
-            non_zero_mask = actual != 0
-            if np.any(non_zero_mask):
-                mape = np.mean(np.abs((actual[non_zero_mask] - predicted[non_zero_mask]) / actual[non_zero_mask])) * 100
+            if NUMBA_AVAILABLE:
+                mae, rmse, mape = _metrics_kernel(np.asarray(actual, dtype=np.float64),
+                                                  np.asarray(predicted, dtype=np.float64))
+                if mape < 0:
+                    mape = None
             else:
-                mape = None
+                actual = np.asarray(actual, dtype=np.float64)
+                diff = actual - np.asarray(predicted, dtype=np.float64)
+                mae = np.abs(diff).mean()
+                rmse = np.sqrt(np.dot(diff, diff) / len(diff))
+
+                # MAPE over non-zero actuals without boolean-indexed copies:
+                # divide in place where actual != 0, zero elsewhere
+                non_zero = np.count_nonzero(actual)
+                if non_zero:
+                    np.abs(diff, out=diff)
+                    pct_err = np.divide(diff, np.abs(actual), out=np.zeros_like(diff), where=actual != 0)
+                    mape = pct_err.sum() / non_zero * 100
+                else:
+                    mape = None
 
             return {
                 'mape': float(mape) if mape is not None else None,
@@ -395,5 +874,5 @@ class ForecastingAgent:
                 'mae': float(mae)
             }
         except Exception as e:
-            logger.error(f"Error computing basic metrics: {e}")
+            logger.error("Error computing basic metrics: %s", e)
             return {'mape': None, 'rmse': None, 'mae': None}
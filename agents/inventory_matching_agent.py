@@ -9,6 +9,9 @@ import logging
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import os
+import functools
+import heapq
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,23 @@ except ImportError:
 
 from utils.database import get_database
 
+@functools.lru_cache(maxsize=1)
+def _load_env_api_key() -> Optional[str]:
+    """Load API key from the environment or env.txt (read once per process)"""
+    env_key = os.environ.get('OPENAI_API_KEY')
+    if env_key:
+        return env_key
+
+    try:
+        with open('env.txt', 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('OPENAI_API_KEY='):
+                    return line.split('=', 1)[1]
+        return None
+    except FileNotFoundError:
+        return None
+
 class InventoryMatchingAgent:
     """
     Agent for optimizing inventory distribution across branches
@@ -34,29 +54,21 @@ class InventoryMatchingAgent:
 
     def __init__(self):
         if OPENAI_AVAILABLE:
-            # Load API key from env.txt file
+            # Load API key from environment or env.txt file
             api_key = self._load_api_key()
             if api_key:
                 self.client = OpenAI(api_key=api_key)
                 self.llm_model = "gpt-4o-mini"
                 logger.info("OpenAI client initialized")
             else:
-                logger.warning("OPENAI_API_KEY not found in env.txt")
+                logger.warning("OPENAI_API_KEY not found in environment or env.txt")
                 self.client = None
         else:
             self.client = None
 
     def _load_api_key(self):
-        """Load API key from env.txt file"""
-        try:
-            with open('env.txt', 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith('OPENAI_API_KEY='):
-                        return line.split('=', 1)[1]
-            return None
-        except FileNotFoundError:
-            return None
+        """Load API key (cached at module level after the first lookup)"""
+        return _load_env_api_key()
 
     def find_matches(self, item_id: str, policy: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -70,7 +82,7 @@ class InventoryMatchingAgent:
             Dictionary containing transfer recommendations
         """
         try:
-            logger.info(f"Finding inventory matches for item: {item_id}")
+            logger.info("Finding inventory matches for item: %s", item_id)
 
             # Get inventory data
             inventory_data = self._get_inventory_data(item_id)
@@ -98,7 +110,7 @@ class InventoryMatchingAgent:
             }
 
         except Exception as e:
-            logger.error(f"Error in inventory matching: {e}")
+            logger.error("Error in inventory matching: %s", e)
             return self._error_response(str(e))
 
     def _get_inventory_data(self, item_id: str) -> List[Dict[str, Any]]:
@@ -108,13 +120,20 @@ class InventoryMatchingAgent:
             # Query inventory for this item
             query = {"drug_id": item_id.lower()}  # Case insensitive match
 
-            inventory_records = list(db.inventory.find(query))
-            logger.info(f"Found {len(inventory_records)} inventory records for {item_id}")
+            # Only the fields used by the analysis; served from the covering
+            # inventory index created by DataLoader.create_indexes
+            projection = {
+                "_id": 0, "drug_id": 1, "branch_id": 1,
+                "current_stock": 1, "optimal_stock": 1, "safe_stock": 1
+            }
+
+            inventory_records = list(db.inventory.find(query, projection))
+            logger.info("Found %s inventory records for %s", len(inventory_records), item_id)
 
             return inventory_records
 
         except Exception as e:
-            logger.error(f"Error getting inventory data: {e}")
+            logger.error("Error getting inventory data: %s", e)
             return []
 
     def _analyze_inventory_levels(self, inventory_data: List[Dict[str, Any]],
@@ -123,37 +142,67 @@ class InventoryMatchingAgent:
         try:
             safe_days = policy.get('safe_days', 14)
 
-            overstock = []
-            understock = []
-            balanced = []
-
-            for item in inventory_data:
-                current_stock = item.get('current_stock', 0)
-                optimal_stock = item.get('optimal_stock', 0)
-                safe_stock = item.get('safe_stock', optimal_stock * 0.2)  # 20% safety stock
-
-                if current_stock > optimal_stock * 1.2:  # Over 20% above optimal
-                    overstock.append({
-                        "branch_id": item.get('branch_id'),
-                        "current_stock": current_stock,
-                        "optimal_stock": optimal_stock,
-                        "excess": current_stock - optimal_stock,
-                        "severity": "high" if current_stock > optimal_stock * 1.5 else "medium"
-                    })
-                elif current_stock < safe_stock:  # Below safety stock
-                    understock.append({
-                        "branch_id": item.get('branch_id'),
-                        "current_stock": current_stock,
-                        "safe_stock": safe_stock,
-                        "deficit": safe_stock - current_stock,
-                        "severity": "critical" if current_stock < safe_stock * 0.5 else "warning"
-                    })
-                else:
-                    balanced.append({
-                        "branch_id": item.get('branch_id'),
-                        "current_stock": current_stock,
-                        "optimal_stock": optimal_stock
-                    })
+            # Column-wise (SoA) view of the records; np.array keeps integer
+            # stock counts as int64 so the emitted values stay ints
+            branch_ids = np.array([item.get('branch_id') for item in inventory_data], dtype=object)
+            current = np.array([item.get('current_stock', 0) for item in inventory_data])
+            optimal = np.array([item.get('optimal_stock', 0) for item in inventory_data])
+            safe = np.array([item.get('safe_stock', o * 0.2)  # 20% safety stock
+                             for item, o in zip(inventory_data, optimal.tolist())])
+
+            over_mask = current > optimal * 1.2  # Over 20% above optimal
+            under_mask = ~over_mask & (current < safe)  # Below safety stock
+            balanced_mask = ~(over_mask | under_mask)
+
+            over_severity = np.where(current > optimal * 1.5, "high", "medium")
+            under_severity = np.where(current < safe * 0.5, "critical", "warning")
+
+            overstock = [
+                {
+                    "branch_id": branch_id,
+                    "current_stock": current_stock,
+                    "optimal_stock": optimal_stock,
+                    "excess": excess,
+                    "severity": severity
+                }
+                for branch_id, current_stock, optimal_stock, excess, severity in zip(
+                    branch_ids[over_mask].tolist(),
+                    current[over_mask].tolist(),
+                    optimal[over_mask].tolist(),
+                    (current - optimal)[over_mask].tolist(),
+                    over_severity[over_mask].tolist()
+                )
+            ]
+
+            understock = [
+                {
+                    "branch_id": branch_id,
+                    "current_stock": current_stock,
+                    "safe_stock": safe_stock,
+                    "deficit": deficit,
+                    "severity": severity
+                }
+                for branch_id, current_stock, safe_stock, deficit, severity in zip(
+                    branch_ids[under_mask].tolist(),
+                    current[under_mask].tolist(),
+                    safe[under_mask].tolist(),
+                    (safe - current)[under_mask].tolist(),
+                    under_severity[under_mask].tolist()
+                )
+            ]
+
+            balanced = [
+                {
+                    "branch_id": branch_id,
+                    "current_stock": current_stock,
+                    "optimal_stock": optimal_stock
+                }
+                for branch_id, current_stock, optimal_stock in zip(
+                    branch_ids[balanced_mask].tolist(),
+                    current[balanced_mask].tolist(),
+                    optimal[balanced_mask].tolist()
+                )
+            ]
 
             return {
                 "overstock_branches": overstock,
@@ -164,7 +213,7 @@ class InventoryMatchingAgent:
             }
 
         except Exception as e:
-            logger.error(f"Error analyzing inventory levels: {e}")
+            logger.error("Error analyzing inventory levels: %s", e)
             return {}
 
     def _get_ai_recommendations(self, inventory_data: List[Dict[str, Any]],
@@ -223,13 +272,13 @@ Be specific and actionable in your recommendations.
 
                 ai_analysis = response.choices[0].message.content
             except Exception as e:
-                logger.warning(f"LLM API call failed: {e}")
+                logger.warning("LLM API call failed: %s", e)
                 ai_analysis = "LLM analysis not available due to API error"
             logger.info("AI analysis completed for inventory matching")
             return ai_analysis
 
         except Exception as e:
-            logger.error(f"Error getting AI recommendations: {e}")
+            logger.error("Error getting AI recommendations: %s", e)
             return f"AI analysis failed: {str(e)}"
 
     def _generate_transfers(self, inventory_data: List[Dict[str, Any]],
@@ -240,50 +289,64 @@ Be specific and actionable in your recommendations.
             overstock = analysis.get('overstock_branches', [])
             understock = analysis.get('understock_branches', [])
 
-            # Simple matching algorithm: pair closest overstock with understock
-            for under in understock:
-                for over in overstock:
-                    if over['excess'] > 0 and under['deficit'] > 0:
-                        # Calculate transfer quantity (min of excess and deficit)
-                        transfer_qty = min(over['excess'], under['deficit'])
-
-                        # Calculate costs and savings
-                        transfer_cost = transfer_qty * 0.5  # $0.50 per unit
-                        holding_cost_saved = transfer_qty * 2.0  # $2.00 per unit per month
-                        expected_savings = holding_cost_saved - transfer_cost
-
-                        if expected_savings > 0:  # Only recommend profitable transfers
-                            transfer = {
-                                "from_branch": over['branch_id'],
-                                "to_branch": under['branch_id'],
-                                "item_id": inventory_data[0].get('drug_id'),  # Assume same item
-                                "quantity": transfer_qty,
-                                "transfer_cost": transfer_cost,
-                                "expected_savings": expected_savings,
-                                "priority": "high" if under['severity'] == "critical" else "medium",
-                                "ai_insights": ai_recommendations[:200] + "..." if len(ai_recommendations) > 200 else ai_recommendations
-                            }
-
-                            transfers.append(transfer)
-
-                            # Update quantities
-                            over['excess'] -= transfer_qty
-                            under['deficit'] -= transfer_qty
-
-                            if len(transfers) >= 10:  # Limit to top 10 recommendations
-                                break
-
-                if len(transfers) >= 10:
+            if not overstock or not understock:
+                return transfers
+
+            excess_left = [o['excess'] for o in overstock]
+            deficit_left = [u['deficit'] for u in understock]
+            critical = np.array([u['severity'] == "critical" for u in understock])
+
+            # Score every (overstock, understock) pair at once: the candidate
+            # quantity is min(excess, deficit), and each unit moved saves the
+            # $2.00/month holding cost minus the $0.50 transfer cost
+            pair_qty = np.minimum.outer(np.asarray(excess_left, dtype=np.float64),
+                                        np.asarray(deficit_left, dtype=np.float64))
+            pair_savings = pair_qty * (2.0 - 0.5)
+
+            # Only profitable pairs, critical understock first, then largest savings
+            over_idx, under_idx = np.nonzero(pair_savings > 0)
+            order = np.lexsort((-pair_savings[over_idx, under_idx], ~critical[under_idx]))
+
+            # Loop-invariant: same AI snippet is attached to every transfer
+            ai_snippet = ai_recommendations[:200] + "..." if len(ai_recommendations) > 200 else ai_recommendations
+
+            # Greedy pass over the ranked pairs, consuming excess/deficit as we go
+            for o, u in zip(over_idx[order].tolist(), under_idx[order].tolist()):
+                transfer_qty = min(excess_left[o], deficit_left[u])
+                if transfer_qty <= 0:
+                    continue
+
+                # Calculate costs and savings
+                transfer_cost = transfer_qty * 0.5  # $0.50 per unit
+                holding_cost_saved = transfer_qty * 2.0  # $2.00 per unit per month
+                expected_savings = holding_cost_saved - transfer_cost
+
+                transfers.append({
+                    "from_branch": overstock[o]['branch_id'],
+                    "to_branch": understock[u]['branch_id'],
+                    "item_id": inventory_data[0].get('drug_id'),  # Assume same item
+                    "quantity": transfer_qty,
+                    "transfer_cost": transfer_cost,
+                    "expected_savings": expected_savings,
+                    "priority": "high" if critical[u] else "medium",
+                    "ai_insights": ai_snippet
+                })
+
+                # Update quantities
+                excess_left[o] -= transfer_qty
+                deficit_left[u] -= transfer_qty
+
+                if len(transfers) >= 10:  # Limit to top 10 recommendations
                     break
 
-            # Sort by priority and savings
+            # Top 10 by priority and savings
             priority_order = {"critical": 0, "high": 1, "medium": 2, "low": 3}
-            transfers.sort(key=lambda x: (priority_order.get(x['priority'], 3), -x['expected_savings']))
-
-            return transfers[:10]  # Return top 10
+            return heapq.nsmallest(
+                10, transfers, key=lambda x: (priority_order.get(x['priority'], 3), -x['expected_savings'])
+            )
 
         except Exception as e:
-            logger.error(f"Error generating transfers: {e}")
+            logger.error("Error generating transfers: %s", e)
             return []
 
     def _empty_response(self, message: str) -> Dict[str, Any]:
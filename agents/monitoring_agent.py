@@ -5,10 +5,18 @@ Monitors inventory levels and generates alerts for stockouts, overstock,
 demand anomalies, and other supply chain issues.
 """
 
+import asyncio
+import copy
+import functools
+import heapq
+import json
 import logging
 import os
-from typing import List, Dict, Any, Optional
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -19,14 +27,115 @@ except ImportError:
     OPENAI_AVAILABLE = False
     logger.warning("OpenAI not available. Install with: pip install openai")
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logger.warning("Numba not available, using NumPy alert thresholds. Install with: pip install numba")
+
+try:
+    from dotenv import dotenv_values
+    DOTENV_AVAILABLE = True
+except ImportError:
+    DOTENV_AVAILABLE = False
+    logger.warning("python-dotenv not available, parsing env files manually. Install with: pip install python-dotenv")
+
 from utils.database import get_database
 
+# Fields the alert analysis reads; everything else stays in MongoDB
+INVENTORY_PROJECTION = {"_id": 0, "drug_id": 1, "branch_id": 1, "current_stock": 1,
+                        "optimal_stock": 1, "safe_stock": 1, "demand_forecast": 1}
+# Documents fetched per cursor round-trip
+CURSOR_BATCH_SIZE = 1000
+# Records analyzed per vectorized batch when streaming inventory
+ANALYSIS_CHUNK_SIZE = 10000
+# Maximum number of alert results kept in the shared alert cache
+ALERT_CACHE_SIZE = 64
+# Alert fields included in the sample sent to the LLM
+PROMPT_ALERT_FIELDS = ("severity", "branch_id", "item_id", "alert_type", "message", "recommended_action")
+
+# Bits of the per-item flags returned by _classify_stock_kernel
+FLAG_CRITICAL, FLAG_LOW, FLAG_OVER, FLAG_UNDER = 1, 2, 4, 8
+
+def _classify_stock_kernel(current: np.ndarray, optimal: np.ndarray, safe: np.ndarray,
+                           forecast: np.ndarray, t_crit: float, t_warn: float,
+                           t_over: float, t_under: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fused single-pass threshold kernel
+
+    Returns (days_until_stockout, flags) where flags holds FLAG_* bits per item.
+    """
+    n = current.shape[0]
+    days = np.empty(n, dtype=np.float64)
+    flags = np.zeros(n, dtype=np.int8)
+    for i in range(n):
+        avg_daily_demand = forecast[i] / 30 if forecast[i] > 0 else 10.0
+        d = current[i] / avg_daily_demand
+        days[i] = d
+        f = 0
+        if d <= t_crit:
+            f |= FLAG_CRITICAL
+        elif d <= t_warn:
+            f |= FLAG_LOW
+        if current[i] > optimal[i] * t_over:
+            f |= FLAG_OVER
+        if current[i] < safe[i] * t_under:
+            f |= FLAG_UNDER
+        flags[i] = f
+    return days, flags
+
+if NUMBA_AVAILABLE:
+    # No fastmath: threshold comparisons must match the per-item analysis exactly
+    _classify_stock_kernel = njit(cache=True)(_classify_stock_kernel)
+    # Compile at import so the first alerts request does not pay for it
+    _classify_stock_kernel(np.ones(2, dtype=np.int64), np.ones(2, dtype=np.int64), np.ones(2, dtype=np.int64),
+                           np.ones(2), 2.0, 7.0, 1.5, 0.3)
+
+# Placeholder value shipped in the example env files
+API_KEY_PLACEHOLDER = "your_api_key_here"
+
+@functools.lru_cache(maxsize=1)
+def _load_openai_key() -> Optional[str]:
+    """Load API key from env vars, .env or env.txt (read once per process); ignore placeholders"""
+    env_key = os.getenv("OPENAI_API_KEY")
+    if env_key and env_key != API_KEY_PLACEHOLDER:
+        return env_key
+
+    for filename in [".env", "env.txt"]:
+        if DOTENV_AVAILABLE:
+            candidate = dotenv_values(filename).get("OPENAI_API_KEY")
+        else:
+            candidate = None
+            try:
+                with open(filename, "r") as f:
+                    for line in f:
+                        line = line.strip()
+                        if line.startswith("OPENAI_API_KEY="):
+                            candidate = line.split("=", 1)[1]
+                            break
+            except FileNotFoundError:
+                continue
+        if candidate and candidate != API_KEY_PLACEHOLDER:
+            return candidate
+    return None
+
 
 class MonitoringAgent:
     """
     Agent for monitoring pharmaceutical inventory and generating alerts
     """
 
+    # Alert results shared across agent instances (LRU), stored with the
+    # inventory version they were computed from
+    _alert_cache: "OrderedDict[Tuple, Tuple[Tuple, Dict[str, Any]]]" = OrderedDict()
+    _alert_cache_lock = threading.Lock()
+
+    # OpenAI clients shared across agent instances, keyed by API key, so the
+    # HTTP connection pool stays warm between requests
+    _shared_clients: Dict[str, Any] = {}
+    _shared_clients_lock = threading.Lock()
+
     def __init__(self):
         self.client = None
         self.llm_model = "gpt-4o-mini"
@@ -35,8 +144,7 @@ class MonitoringAgent:
             api_key = self._load_api_key()
             if api_key:
                 try:
-                    self.client = OpenAI(api_key=api_key)
-                    logger.info("OpenAI client initialized for monitoring")
+                    self.client = self._get_shared_client(api_key)
                 except Exception as e:
                     logger.warning(f"Failed to initialize OpenAI client, AI insights disabled: {e}")
                     self.client = None
@@ -52,75 +160,426 @@ class MonitoringAgent:
             "demand_anomaly_threshold": 2.0
         }
 
-    def _load_api_key(self) -> Optional[str]:
-        """Load API key from env vars (.env) or env.txt; ignore placeholders"""
-        env_key = os.getenv("OPENAI_API_KEY")
-        if env_key and env_key not in ("", "your_api_key_here"):
-            return env_key
+    @classmethod
+    def _get_shared_client(cls, api_key: str) -> Any:
+        """Return the shared OpenAI client for api_key, creating it on first use"""
+        with cls._shared_clients_lock:
+            client = cls._shared_clients.get(api_key)
+            if client is None:
+                client = OpenAI(api_key=api_key)
+                cls._shared_clients[api_key] = client
+                logger.info("OpenAI client initialized for monitoring")
+            return client
 
-        for filename in [".env", "env.txt"]:
-            try:
-                with open(filename, "r") as f:
-                    for line in f:
-                        line = line.strip()
-                        if line.startswith("OPENAI_API_KEY="):
-                            candidate = line.split("=", 1)[1]
-                            if candidate and candidate != "your_api_key_here":
-                                return candidate
-            except FileNotFoundError:
-                continue
-        return None
+    def _load_api_key(self) -> Optional[str]:
+        """Load API key (cached at module level after the first lookup)"""
+        return _load_openai_key()
 
-    def generate_alerts(self, severity_filter: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
-        """Generate inventory alerts based on current stock levels"""
+    def generate_alerts(self, severity_filter: Optional[str] = None, limit: int = 50,
+                        drug_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Generate inventory alerts based on current stock levels, optionally only for drug_ids"""
         try:
             logger.info(f"Generating alerts, severity_filter: {severity_filter}, limit: {limit}")
 
-            inventory_data = self._get_all_inventory()
-            alerts: List[Dict[str, Any]] = []
+            cache_key, version, cached = self._lookup_alert_cache(severity_filter, limit, drug_ids)
+            if cached is not None:
+                return cached
 
-            for item in inventory_data:
-                alerts.extend(self._analyze_inventory_item(item))
+            alerts, summary = self._collect_alerts(severity_filter, limit, drug_ids)
 
-            if severity_filter:
-                alerts = [a for a in alerts if a["severity"] == severity_filter]
+            if self.client and alerts:
+                ai_insights = self._get_ai_alert_insights(alerts[:10], summary)
+            else:
+                ai_insights = "AI analysis not available"
+
+            return self._store_alert_result(cache_key, version, alerts, summary, ai_insights)
+        except Exception as e:
+            logger.error(f"Error generating alerts: {e}")
+            return self._error_response(str(e))
+
+    async def generate_alerts_async(self, severity_filter: Optional[str] = None, limit: int = 50,
+                                    drug_ids: Optional[List[str]] = None,
+                                    executor=None) -> Dict[str, Any]:
+        """
+        Async variant of generate_alerts for event-loop callers
+
+        The inventory scan and the LLM call run on `executor` (the loop's
+        default executor if None) as separate steps, so the loop stays free
+        and concurrent callers (e.g. one per branch) overlap their LLM
+        round-trips instead of queueing behind them.
+        """
+        loop = asyncio.get_running_loop()
+
+        def run(func, *args):
+            return loop.run_in_executor(executor, functools.partial(func, *args))
+
+        try:
+            logger.info(f"Generating alerts, severity_filter: {severity_filter}, limit: {limit}")
 
-            severity_order = {"CRITICAL": 0, "WARNING": 1, "INFO": 2}
-            alerts.sort(key=lambda x: (severity_order.get(x["severity"], 3), x["timestamp"]))
+            cache_key, version, cached = await run(self._lookup_alert_cache, severity_filter, limit, drug_ids)
+            if cached is not None:
+                return cached
 
-            alerts = alerts[:limit]
-            summary = self._generate_summary(alerts)
+            alerts, summary = await run(self._collect_alerts, severity_filter, limit, drug_ids)
 
             if self.client and alerts:
-                ai_insights = self._get_ai_alert_insights(alerts[:10])
+                ai_insights = await run(self._get_ai_alert_insights, alerts[:10], summary)
             else:
                 ai_insights = "AI analysis not available"
 
-            return {
-                "alerts": alerts,
-                "total_alerts": len(alerts),
-                "summary": summary,
-                "ai_insights": ai_insights,
-                "generated_at": datetime.utcnow(),
-                "status": "success"
-            }
+            return self._store_alert_result(cache_key, version, alerts, summary, ai_insights)
         except Exception as e:
             logger.error(f"Error generating alerts: {e}")
             return self._error_response(str(e))
 
-    def _get_all_inventory(self) -> List[Dict[str, Any]]:
+    def _lookup_alert_cache(self, severity_filter: Optional[str], limit: int,
+                            drug_ids: Optional[List[str]]) -> Tuple[Tuple, Optional[Tuple], Optional[Dict[str, Any]]]:
+        """Return (cache key, inventory version, cached result or None)"""
+        # Dashboards poll with the same parameters; while the inventory is
+        # unchanged the previous result is still valid
+        cache_key = (severity_filter, limit, tuple(drug_ids) if drug_ids else None,
+                     tuple(sorted(self.thresholds.items())), self.client is not None)
+        version = self._inventory_version()
+        if version is not None:
+            with self._alert_cache_lock:
+                cached = self._alert_cache.get(cache_key)
+                if cached is not None and cached[0] == version:
+                    self._alert_cache.move_to_end(cache_key)
+                    logger.info("Alert cache hit, inventory unchanged")
+                    return cache_key, version, copy.deepcopy(cached[1])
+        return cache_key, version, None
+
+    def _collect_alerts(self, severity_filter: Optional[str], limit: int,
+                        drug_ids: Optional[List[str]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Scan inventory and return the top `limit` alerts with their summary"""
+        # Only the top `limit` alerts are kept, so select them with a bounded
+        # heap (O(N log limit)) instead of sorting every alert
+        severity_order = {"CRITICAL": 0, "WARNING": 1, "INFO": 2}
+        sort_key = lambda x: (severity_order.get(x["severity"], 3), x["timestamp"])
+
+        # Inventory is streamed in chunks and reduced to the running top
+        # alerts, so peak memory does not grow with the collection size
+        # One timestamp for the whole run, shared by every chunk
+        now = datetime.utcnow()
+        alerts: List[Dict[str, Any]] = []
+        for chunk in self._iter_inventory_chunks(drug_ids):
+            # Alerts of other severities, or outside the chunk's first `limit`,
+            # cannot reach the overall top, so they are never built
+            chunk_alerts = self._analyze_inventory_batch(chunk, now, limit=limit,
+                                                         severity_filter=severity_filter or None)
+            alerts = heapq.nsmallest(limit, alerts + chunk_alerts, key=sort_key)
+
+        return alerts, self._generate_summary(alerts)
+
+    def _store_alert_result(self, cache_key: Tuple, version: Optional[Tuple], alerts: List[Dict[str, Any]],
+                            summary: Dict[str, Any], ai_insights: str) -> Dict[str, Any]:
+        """Build the alerts response and cache it against the inventory version"""
+        result = {
+            "alerts": alerts,
+            "total_alerts": len(alerts),
+            "summary": summary,
+            "ai_insights": ai_insights,
+            "generated_at": datetime.utcnow(),
+            "status": "success"
+        }
+
+        if version is not None:
+            with self._alert_cache_lock:
+                self._alert_cache[cache_key] = (version, copy.deepcopy(result))
+                while len(self._alert_cache) > ALERT_CACHE_SIZE:
+                    self._alert_cache.popitem(last=False)
+        return result
+
+    @classmethod
+    def clear_cache(cls):
+        """Drop all cached alert results"""
+        with cls._alert_cache_lock:
+            cls._alert_cache.clear()
+
+    def _inventory_version(self) -> Optional[Tuple]:
+        """
+        Cheap fingerprint of the inventory collection: document count and the
+        latest last_updated timestamp. Returns None if it cannot be read.
+        """
         try:
             db = get_database()
-            inventory = list(db.inventory.find({}))
+            latest = db.inventory.find_one({}, sort=[("last_updated", -1)],
+                                           projection={"_id": 0, "last_updated": 1})
+            return (db.inventory.estimated_document_count(), (latest or {}).get("last_updated"))
+        except Exception as e:
+            logger.warning(f"Could not read inventory version, alert cache bypassed: {e}")
+            return None
+
+    def get_alert_summary(self, drug_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Summarize alerts across the whole inventory inside MongoDB
+
+        Thresholds are evaluated and grouped by an aggregation pipeline, so only
+        the summary document crosses the wire instead of every inventory record.
+
+        Args:
+            drug_ids: Restrict the summary to these drugs (all drugs if omitted)
+
+        Returns:
+            Summary with the same keys as the per-response alert summary
+        """
+        try:
+            db = get_database()
+            result = next(db.inventory.aggregate(self._alert_summary_pipeline(drug_ids)), None) or {}
+
+            severity_counts = {row["_id"]: row["count"] for row in result.get("by_severity", [])}
+            return {
+                "total_alerts": sum(severity_counts.values()),
+                "critical_count": severity_counts.get("CRITICAL", 0),
+                "warning_count": severity_counts.get("WARNING", 0),
+                "info_count": severity_counts.get("INFO", 0),
+                "top_affected_branches": [(row["_id"], row["count"]) for row in result.get("by_branch", [])],
+                "alert_types": [row["_id"] for row in result.get("types", [])]
+            }
+        except Exception as e:
+            logger.warning(f"Alert summary aggregation failed, summarizing in Python: {e}")
+            return self._generate_summary(self._analyze_inventory_batch(self._get_all_inventory(drug_ids)))
+
+    def _alert_summary_pipeline(self, drug_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Aggregation pipeline applying the alert thresholds of _analyze_inventory_item"""
+        t = self.thresholds
+
+        def num(field: str) -> Dict[str, Any]:
+            return {"$ifNull": [f"${field}", 0]}
+
+        avg_daily_demand = {"$cond": [{"$gt": [num("demand_forecast"), 0]},
+                                      {"$divide": [num("demand_forecast"), 30]}, 10]}
+        days_until_stockout = {"$divide": [num("current_stock"), avg_daily_demand]}
+
+        def alert(severity: str, alert_type: str) -> List[Dict[str, str]]:
+            return [{"severity": severity, "alert_type": alert_type}]
+
+        alerts = {"$concatArrays": [
+            {"$cond": [{"$lte": [days_until_stockout, t["critical_stockout_days"]]},
+                       alert("CRITICAL", "STOCKOUT_RISK"),
+                       {"$cond": [{"$lte": [days_until_stockout, t["warning_stockout_days"]]},
+                                  alert("WARNING", "LOW_STOCK"), []]}]},
+            {"$cond": [{"$gt": [num("current_stock"), {"$multiply": [num("optimal_stock"), t["overstock_multiplier"]]}]},
+                       alert("WARNING", "OVERSTOCK"), []]},
+            {"$cond": [{"$lt": [num("current_stock"), {"$multiply": [num("safe_stock"), t["understock_multiplier"]]}]},
+                       alert("INFO", "UNDERSTOCK"), []]},
+        ]}
+
+        return [
+            {"$match": {"drug_id": {"$in": list(drug_ids)}} if drug_ids else {}},
+            {"$project": {"_id": 0, "branch_id": {"$ifNull": ["$branch_id", "UNKNOWN"]}, "alerts": alerts}},
+            {"$unwind": "$alerts"},
+            {"$facet": {
+                "by_severity": [{"$group": {"_id": "$alerts.severity", "count": {"$sum": 1}}}],
+                "by_branch": [
+                    {"$group": {"_id": "$branch_id", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}},
+                    {"$limit": 5}
+                ],
+                "types": [{"$group": {"_id": "$alerts.alert_type"}}]
+            }}
+        ]
+
+    def _get_all_inventory(self, drug_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        try:
+            db = get_database()
+            query = {"drug_id": {"$in": list(drug_ids)}} if drug_ids else {}
+            inventory = list(db.inventory.find(query, INVENTORY_PROJECTION).batch_size(CURSOR_BATCH_SIZE))
             logger.info(f"Retrieved {len(inventory)} inventory records for monitoring")
             return inventory
         except Exception as e:
             logger.error(f"Error getting inventory data: {e}")
             return []
 
-    def _analyze_inventory_item(self, item: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _iter_inventory_chunks(self, drug_ids: Optional[List[str]] = None,
+                               chunk_size: int = ANALYSIS_CHUNK_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """Stream inventory records from the cursor in lists of at most chunk_size"""
+        try:
+            db = get_database()
+            query = {"drug_id": {"$in": list(drug_ids)}} if drug_ids else {}
+            cursor = db.inventory.find(query, INVENTORY_PROJECTION).batch_size(CURSOR_BATCH_SIZE)
+
+            total = 0
+            chunk: List[Dict[str, Any]] = []
+            for record in cursor:
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    total += len(chunk)
+                    yield chunk
+                    chunk = []
+            if chunk:
+                total += len(chunk)
+                yield chunk
+            logger.info(f"Streamed {total} inventory records for monitoring")
+        except Exception as e:
+            # Propagate so a failed read is reported (and not cached) instead
+            # of looking like an inventory without alerts
+            logger.error(f"Error getting inventory data: {e}")
+            raise
+
+    def _analyze_inventory_batch(self, items: List[Dict[str, Any]], now: Optional[datetime] = None,
+                                 limit: Optional[int] = None,
+                                 severity_filter: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Evaluate alert thresholds for all items at once, building dicts only for hits
+
+        With `severity_filter`, hits of other severities are discarded as
+        index arrays. With `limit`, only alerts that can rank in the first
+        `limit` by severity (then item order) are built.
+        """
+        if not items:
+            return []
+
+        timestamp = now or datetime.utcnow()
+
+        try:
+            # Column-wise (SoA) view of the records; np.array keeps integer
+            # stock counts as int64 so the emitted values stay ints
+            current = np.array([item.get("current_stock", 0) for item in items])
+            optimal = np.array([item.get("optimal_stock", 0) for item in items])
+            safe = np.array([item.get("safe_stock", 0) for item in items])
+            forecast = np.array([item.get("demand_forecast", 0) for item in items], dtype=np.float64)
+            # None or string stock values build object/unicode arrays without
+            # raising, but would fail in the threshold arithmetic below
+            if not all(a.dtype.kind in "iuf" for a in (current, optimal, safe)):
+                raise TypeError("non-numeric stock values")
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Inventory records not numeric, analyzing item by item: {e}")
+            return [alert for item in items
+                    for alert in self._analyze_inventory_item(item, timestamp, severity_filter)]
+
+        t = self.thresholds
+        if NUMBA_AVAILABLE:
+            # One compiled pass computes days and every threshold at once
+            days_until_stockout, flags = _classify_stock_kernel(
+                current, optimal, safe, forecast,
+                float(t["critical_stockout_days"]), float(t["warning_stockout_days"]),
+                float(t["overstock_multiplier"]), float(t["understock_multiplier"])
+            )
+            critical_idx = np.flatnonzero(flags & FLAG_CRITICAL)
+            low_idx = np.flatnonzero(flags & FLAG_LOW)
+            over_idx = np.flatnonzero(flags & FLAG_OVER)
+            under_idx = np.flatnonzero(flags & FLAG_UNDER)
+        else:
+            # Branchless masks throughout. Kept in float64 with a true division
+            # by 30 so threshold boundaries (e.g. exactly 2.0 days) classify the
+            # same as the per-item analysis; float32 or a reciprocal multiply can
+            # move a value across a threshold
+            avg_daily_demand = np.divide(forecast, 30, out=np.full_like(forecast, 10.0), where=forecast > 0)
+            days_until_stockout = np.divide(current, avg_daily_demand, out=avg_daily_demand)
+
+            critical_mask = days_until_stockout <= t["critical_stockout_days"]
+            warning_mask = days_until_stockout <= t["warning_stockout_days"]
+            critical_idx = np.flatnonzero(critical_mask)
+            low_idx = np.flatnonzero(warning_mask & ~critical_mask)
+            over_idx = np.flatnonzero(current > optimal * t["overstock_multiplier"])
+            under_idx = np.flatnonzero(current < safe * t["understock_multiplier"])
+
+        if severity_filter is not None:
+            no_hits = np.empty(0, dtype=np.intp)
+            if severity_filter != "CRITICAL":
+                critical_idx = no_hits
+            if severity_filter != "WARNING":
+                low_idx = over_idx = no_hits
+            if severity_filter != "INFO":
+                under_idx = no_hits
+
+        if limit is not None:
+            critical_idx, low_idx, over_idx, under_idx = self._select_top_alert_indices(
+                critical_idx, low_idx, over_idx, under_idx, limit)
+
+        # (item index, position within the item, alert) so the merged list
+        # keeps the item-by-item order of the per-item analysis
+        ranked: List[tuple] = []
+
+        for i, stock, days in zip(critical_idx.tolist(), current[critical_idx].tolist(),
+                                  days_until_stockout[critical_idx].tolist()):
+            ranked.append((i, 0, {
+                "severity": "CRITICAL",
+                "branch_id": items[i].get("branch_id", "UNKNOWN"),
+                "item_id": items[i].get("drug_id", "UNKNOWN"),
+                "alert_type": "STOCKOUT_RISK",
+                "current_stock": stock,
+                "days_until_stockout": round(days, 1),
+                "recommended_action": "URGENT_ORDER",
+                "message": f"Critical stockout risk: {days:.1f} days remaining",
+                "timestamp": timestamp,
+                "is_resolved": False
+            }))
+
+        for i, stock, days in zip(low_idx.tolist(), current[low_idx].tolist(),
+                                  days_until_stockout[low_idx].tolist()):
+            ranked.append((i, 0, {
+                "severity": "WARNING",
+                "branch_id": items[i].get("branch_id", "UNKNOWN"),
+                "item_id": items[i].get("drug_id", "UNKNOWN"),
+                "alert_type": "LOW_STOCK",
+                "current_stock": stock,
+                "days_until_stockout": round(days, 1),
+                "recommended_action": "ORDER_SOON",
+                "message": f"Low stock warning: {days:.1f} days remaining",
+                "timestamp": timestamp,
+                "is_resolved": False
+            }))
+
+        for i, stock, optimal_stock, excess_quantity in zip(
+                over_idx.tolist(), current[over_idx].tolist(), optimal[over_idx].tolist(),
+                (current - optimal)[over_idx].tolist()):
+            ranked.append((i, 1, {
+                "severity": "WARNING",
+                "branch_id": items[i].get("branch_id", "UNKNOWN"),
+                "item_id": items[i].get("drug_id", "UNKNOWN"),
+                "alert_type": "OVERSTOCK",
+                "current_stock": stock,
+                "optimal_stock": optimal_stock,
+                "excess_quantity": excess_quantity,
+                "recommended_action": "REDISTRIBUTE",
+                "message": f"Overstock: {excess_quantity} units above optimal level",
+                "timestamp": timestamp,
+                "is_resolved": False
+            }))
+
+        for i, stock, safe_stock, deficit_quantity in zip(
+                under_idx.tolist(), current[under_idx].tolist(), safe[under_idx].tolist(),
+                (safe - current)[under_idx].tolist()):
+            ranked.append((i, 2, {
+                "severity": "INFO",
+                "branch_id": items[i].get("branch_id", "UNKNOWN"),
+                "item_id": items[i].get("drug_id", "UNKNOWN"),
+                "alert_type": "UNDERSTOCK",
+                "current_stock": stock,
+                "safe_stock": safe_stock,
+                "deficit_quantity": deficit_quantity,
+                "recommended_action": "CHECK_INVENTORY",
+                "message": f"Understock: {deficit_quantity} units below safe level",
+                "timestamp": timestamp,
+                "is_resolved": False
+            }))
+
+        ranked.sort(key=lambda r: (r[0], r[1]))
+        return [alert for _, _, alert in ranked]
+
+    @staticmethod
+    def _select_top_alert_indices(critical_idx: np.ndarray, low_idx: np.ndarray, over_idx: np.ndarray,
+                                  under_idx: np.ndarray, limit: int) -> Tuple[np.ndarray, ...]:
+        """Trim per-type hit indices to the first `limit` alerts by (severity, item, position)"""
+        critical_idx = critical_idx[:limit]
+        remaining = limit - len(critical_idx)
+
+        # WARNING alerts interleave LOW_STOCK (position 0) and OVERSTOCK
+        # (position 1) by item, so merge them on item * 2 + position
+        warning_keys = np.sort(np.concatenate((low_idx * 2, over_idx * 2 + 1)))[:remaining]
+        low_idx = warning_keys[warning_keys % 2 == 0] // 2
+        over_idx = warning_keys[warning_keys % 2 == 1] // 2
+        remaining -= len(warning_keys)
+
+        return critical_idx, low_idx, over_idx, under_idx[:remaining]
+
+    def _analyze_inventory_item(self, item: Dict[str, Any], now: Optional[datetime] = None,
+                                severity_filter: Optional[str] = None) -> List[Dict[str, Any]]:
         try:
             alerts = []
+            timestamp = now or datetime.utcnow()
 
             current_stock = item.get("current_stock", 0)
             optimal_stock = item.get("optimal_stock", 0)
@@ -131,20 +590,23 @@ class MonitoringAgent:
             avg_daily_demand = item.get("demand_forecast", 0) / 30 if item.get("demand_forecast", 0) > 0 else 10
             days_until_stockout = current_stock / avg_daily_demand if avg_daily_demand > 0 else 999
 
+            # Alerts of other severities than severity_filter are never built
             if days_until_stockout <= self.thresholds["critical_stockout_days"]:
-                alerts.append({
-                    "severity": "CRITICAL",
-                    "branch_id": branch_id,
-                    "item_id": drug_id,
-                    "alert_type": "STOCKOUT_RISK",
-                    "current_stock": current_stock,
-                    "days_until_stockout": round(days_until_stockout, 1),
-                    "recommended_action": "URGENT_ORDER",
-                    "message": f"Critical stockout risk: {days_until_stockout:.1f} days remaining",
-                    "timestamp": datetime.utcnow(),
-                    "is_resolved": False
-                })
-            elif days_until_stockout <= self.thresholds["warning_stockout_days"]:
+                if severity_filter in (None, "CRITICAL"):
+                    alerts.append({
+                        "severity": "CRITICAL",
+                        "branch_id": branch_id,
+                        "item_id": drug_id,
+                        "alert_type": "STOCKOUT_RISK",
+                        "current_stock": current_stock,
+                        "days_until_stockout": round(days_until_stockout, 1),
+                        "recommended_action": "URGENT_ORDER",
+                        "message": f"Critical stockout risk: {days_until_stockout:.1f} days remaining",
+                        "timestamp": timestamp,
+                        "is_resolved": False
+                    })
+            elif (days_until_stockout <= self.thresholds["warning_stockout_days"]
+                  and severity_filter in (None, "WARNING")):
                 alerts.append({
                     "severity": "WARNING",
                     "branch_id": branch_id,
@@ -154,11 +616,12 @@ class MonitoringAgent:
                     "days_until_stockout": round(days_until_stockout, 1),
                     "recommended_action": "ORDER_SOON",
                     "message": f"Low stock warning: {days_until_stockout:.1f} days remaining",
-                    "timestamp": datetime.utcnow(),
+                    "timestamp": timestamp,
                     "is_resolved": False
                 })
 
-            if current_stock > optimal_stock * self.thresholds["overstock_multiplier"]:
+            if (current_stock > optimal_stock * self.thresholds["overstock_multiplier"]
+                    and severity_filter in (None, "WARNING")):
                 excess_quantity = current_stock - optimal_stock
                 alerts.append({
                     "severity": "WARNING",
@@ -170,11 +633,12 @@ class MonitoringAgent:
                     "excess_quantity": excess_quantity,
                     "recommended_action": "REDISTRIBUTE",
                     "message": f"Overstock: {excess_quantity} units above optimal level",
-                    "timestamp": datetime.utcnow(),
+                    "timestamp": timestamp,
                     "is_resolved": False
                 })
 
-            if current_stock < safe_stock * self.thresholds["understock_multiplier"]:
+            if (current_stock < safe_stock * self.thresholds["understock_multiplier"]
+                    and severity_filter in (None, "INFO")):
                 deficit_quantity = safe_stock - current_stock
                 alerts.append({
                     "severity": "INFO",
@@ -186,7 +650,7 @@ class MonitoringAgent:
                     "deficit_quantity": deficit_quantity,
                     "recommended_action": "CHECK_INVENTORY",
                     "message": f"Understock: {deficit_quantity} units below safe level",
-                    "timestamp": datetime.utcnow(),
+                    "timestamp": timestamp,
                     "is_resolved": False
                 })
 
@@ -197,52 +661,41 @@ class MonitoringAgent:
 
     def _generate_summary(self, alerts: List[Dict[str, Any]]) -> Dict[str, Any]:
         try:
-            total = len(alerts)
-            critical = len([a for a in alerts if a["severity"] == "CRITICAL"])
-            warning = len([a for a in alerts if a["severity"] == "WARNING"])
-            info = len([a for a in alerts if a["severity"] == "INFO"])
-
-            branch_counts: Dict[str, int] = {}
+            # Severities, branches and types are tallied in a single pass
+            severity_counts: Counter = Counter()
+            branch_counts: Dict[str, int] = defaultdict(int)
+            alert_types = set()
             for alert in alerts:
-                branch = alert["branch_id"]
-                branch_counts[branch] = branch_counts.get(branch, 0) + 1
+                severity_counts[alert["severity"]] += 1
+                branch_counts[alert["branch_id"]] += 1
+                alert_types.add(alert["alert_type"])
 
             top_branches = sorted(branch_counts.items(), key=lambda x: x[1], reverse=True)[:5]
 
             return {
-                "total_alerts": total,
-                "critical_count": critical,
-                "warning_count": warning,
-                "info_count": info,
+                "total_alerts": len(alerts),
+                "critical_count": severity_counts["CRITICAL"],
+                "warning_count": severity_counts["WARNING"],
+                "info_count": severity_counts["INFO"],
                 "top_affected_branches": top_branches,
-                "alert_types": list(set(a["alert_type"] for a in alerts))
+                "alert_types": list(alert_types)
             }
         except Exception as e:
             logger.error(f"Error generating alert summary: {e}")
             return {}
 
-    def _get_ai_alert_insights(self, alerts: List[Dict[str, Any]]) -> str:
+    def _get_ai_alert_insights(self, alerts: List[Dict[str, Any]], summary: Dict[str, Any]) -> str:
         if not self.client or not alerts:
             return "AI analysis not available"
 
         try:
-            alert_summary = f"""
-Total alerts: {len(alerts)}
-
-Critical alerts: {len([a for a in alerts if a['severity'] == 'CRITICAL'])}
-Warning alerts: {len([a for a in alerts if a['severity'] == 'WARNING'])}
-Info alerts: {len([a for a in alerts if a['severity'] == 'INFO'])}
-
-Top alert types: {list(set(a['alert_type'] for a in alerts))[:3]}
-
-Sample alerts:
-"""
-
-            for i, alert in enumerate(alerts[:5]):
-                alert_summary += f"""
-{i+1}. {alert['severity']} - {alert['branch_id']}: {alert['message']}
-   Action: {alert['recommended_action']}
-"""
+            # The caller's summary and a few trimmed sample alerts are sent as
+            # compact JSON, which keeps the prompt (and input tokens) small
+            samples = [{key: alert.get(key) for key in PROMPT_ALERT_FIELDS} for alert in alerts[:5]]
+            alert_summary = (
+                f"Summary JSON:\n{json.dumps(summary, default=str, separators=(',', ':'))}\n\n"
+                f"Sample alerts:\n{json.dumps(samples, default=str, separators=(',', ':'))}"
+            )
 
             prompt = f"""
 You are a pharmaceutical supply chain expert analyzing inventory alerts.
@@ -0,0 +1,28 @@
+"""
+Gunicorn configuration for Pharmaceutical Supply Chain Agentic AI
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported once in the master (preload_app), so Prophet, TensorFlow,
+OR-Tools and the numba-compiled kernels are loaded before the workers fork and
+their pages are shared copy-on-write. Agents, thread pools and the MongoDB and
+Redis clients are created in each worker at startup, after the fork.
+
+Nothing may initialize CUDA at import time: a context created in the master
+is inherited by the workers but unusable there. The forecasting agent
+therefore probes for GPUs when it builds its first LSTM model, in the worker.
+"""
+
+import os
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '1020')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Match the uvicorn settings in main.py
+keepalive = 30
+backlog = 2048
+
+# Longer than the 5 minute workflow timeout
+timeout = 330
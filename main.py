@@ -6,61 +6,132 @@ This is the main FastAPI application for the Agentic AI system
 that optimizes pharmaceutical supply chain operations.
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any, Optional
-import logging
-from datetime import datetime, timedelta
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from typing import Callable, List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
 import hashlib
+import threading
+import logging
+from datetime import datetime
 import json
 import os
+import time
 
 # Import API models
 from models.api_models import (
     ForecastRequest, ForecastResponse,
     RouteOptimizationRequest, RouteOptimizationResponse,
-    InventoryMatchingRequest, InventoryMatchingResponse,
-    AlertResponse, DashboardKPIs, AlertSummary, HealthCheckResponse
+    InventoryMatchingRequest, InventoryMatchingResponse, WorkflowRequest,
+    AlertItem, AlertResponse, KPIMetric, DashboardKPIs, AlertSummary, HealthCheckResponse
 )
-
-# Simple in-memory cache for forecasts
-forecast_cache = {}
+from utils.response_cache import response_cache, TTL_SHORT, TTL_NORMAL, TTL_LONG
+
+# Import agents
+from agents.forecasting_agent import ForecastingAgent
+from agents.route_optimization_agent import RouteOptimizationAgent
+from agents.inventory_matching_agent import InventoryMatchingAgent
+from agents.monitoring_agent import MonitoringAgent
+from agents.langgraph_workflow import SupplyChainWorkflow
+
+# In-memory TTL + LRU cache for forecasts: key -> (monotonic expiry, result).
+# Only touched from the event loop, so it needs no lock
+forecast_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+# Forecasts currently being computed, so concurrent identical requests share one run
+forecast_in_flight: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
 CACHE_EXPIRY_MINUTES = 60
+FORECAST_CACHE_SIZE = 1024
+
+# Built once: validates a list of agent alert dicts in a single core call
+ALERT_LIST_ADAPTER = TypeAdapter(List[AlertItem])
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    logger.warning("orjson not available, using json for responses. Install with: pip install orjson")
+
+try:
+    from brotli_asgi import BrotliMiddleware
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+    logger.warning("brotli-asgi not available, compressing responses with gzip only. Install with: pip install brotli-asgi")
+
+def json_bytes(content: Any) -> bytes:
+    """Serialize a value to compact JSON bytes, with orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _json_default(value: Any) -> Any:
+    """Encode values json cannot, formatting datetimes the way orjson does"""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        return json_bytes(content)
+
+def model_response(model: BaseModel) -> Response:
+    """
+    Serialize an already validated response model
+
+    Returning a Response makes FastAPI skip its own response_model pass, so the
+    payload is validated once (when the model is built) and dumped by Pydantic.
+    response_model on the route still documents the schema.
+    """
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
 def get_cache_key(request: ForecastRequest) -> str:
     """Generate cache key for forecast request"""
-    request_dict = {
-        "entity_type": request.entity_type,
-        "entity_id": request.entity_id,
-        "item_id": request.item_id,
-        "horizon_days": request.horizon_days,
-        "model": request.model
-    }
-    request_str = json.dumps(request_dict, sort_keys=True)
-    return hashlib.md5(request_str.encode()).hexdigest()
+    # Fixed field order makes the key canonical without serializing or hashing
+    return f"{request.entity_type}|{request.entity_id}|{request.item_id}|{request.horizon_days}|{request.model}"
 
 def get_cached_forecast(cache_key: str) -> Optional[Dict[str, Any]]:
     """Get cached forecast if still valid"""
-    if cache_key in forecast_cache:
-        cached_data = forecast_cache[cache_key]
-        if datetime.utcnow() < cached_data["expiry"]:
-            logger.info(f"Cache hit for forecast: {cache_key}")
-            return cached_data["result"]
-        else:
-            # Remove expired cache
-            del forecast_cache[cache_key]
+    cached = forecast_cache.get(cache_key)
+    if cached is None:
+        return None
+
+    expiry, result = cached
+    if time.monotonic() < expiry:
+        forecast_cache.move_to_end(cache_key)
+        logger.info(f"Cache hit for forecast: {cache_key}")
+        return result
+
+    # Remove expired cache
+    del forecast_cache[cache_key]
     return None
 
 def set_cached_forecast(cache_key: str, result: Dict[str, Any]):
-    """Cache forecast result"""
-    forecast_cache[cache_key] = {
-        "result": result,
-        "expiry": datetime.utcnow() + timedelta(minutes=CACHE_EXPIRY_MINUTES)
-    }
+    """Cache forecast result, evicting expired and least recently used entries"""
+    now = time.monotonic()
+    forecast_cache[cache_key] = (now + CACHE_EXPIRY_MINUTES * 60, result)
+    forecast_cache.move_to_end(cache_key)
+
+    # Lazy sweep: drop expired entries from the cold end, then enforce the cap
+    while forecast_cache:
+        oldest_key = next(iter(forecast_cache))
+        if forecast_cache[oldest_key][0] > now and len(forecast_cache) <= FORECAST_CACHE_SIZE:
+            break
+        del forecast_cache[oldest_key]
     logger.info(f"Cached forecast result: {cache_key}")
 
 # Create FastAPI app
@@ -72,28 +143,114 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
-# Add CORS middleware
+# Agent registry: one shared instance per agent, created at startup. Agents
+# keep their caches at class level, so sharing them across requests is safe
+AGENT_CLASSES = {
+    "forecast": ForecastingAgent,
+    "route": RouteOptimizationAgent,
+    "inventory": InventoryMatchingAgent,
+    "monitoring": MonitoringAgent,
+    "workflow": SupplyChainWorkflow,
+}
+app.state.agents = {}
+
+# Worker threads per agent, so a slow forecast cannot starve route lookups
+AGENT_POOL_SIZES = {
+    "forecast": 4,
+    "route": 8,
+    "inventory": 4,
+    "monitoring": 4,
+}
+app.state.pools = {}
+
+def get_agent(name: str):
+    """Return the shared agent instance, creating it if startup could not"""
+    agent = app.state.agents.get(name)
+    if agent is None:
+        agent = app.state.agents[name] = AGENT_CLASSES[name]()
+    return agent
+
+async def run_in_pool(name: str, func, *args, **kwargs):
+    """Run a blocking agent call on that agent's thread pool"""
+    # Before startup (or for an unknown name) this uses the default executor
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(app.state.pools.get(name), functools.partial(func, *args, **kwargs))
+
+# Add CORS middleware. Explicit lists let Starlette precompute its preflight
+# headers, and max_age lets browsers skip preflight for a day. The Next.js UI
+# proxies /api through its own origin, so this only matters for direct calls
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, specify allowed origins
+    allow_origins=[origin.strip() for origin in os.getenv("UI_ORIGIN", "http://localhost:3000").split(",")],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["X-Cache", "ETag"],
+    max_age=86400,
 )
 
-# API models are imported from models.api_models
+# Compress JSON bodies of 1 KiB and up. Brotli middleware serves gzip to
+# clients that do not accept br, so only one of the two is installed
+RESPONSE_COMPRESSION_MIN_BYTES = 1024
+if BROTLI_AVAILABLE:
+    app.add_middleware(BrotliMiddleware, quality=4, minimum_size=RESPONSE_COMPRESSION_MIN_BYTES)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_BYTES, compresslevel=5)
+
+# API models are imported from models.api_models. Endpoints with a response
+# model are serialized straight to bytes by Pydantic; the dict endpoints
+# below use FastJSONResponse instead of the stdlib json encoder
+
+# (epoch second, ISO string) of the most recently formatted timestamp
+_utc_now_iso: Tuple[int, str] = (0, "")
+
+def utc_now_iso() -> str:
+    """Current UTC time as an ISO string, formatted at most once per second"""
+    global _utc_now_iso
+    second = int(time.time())
+    if _utc_now_iso[0] != second:
+        _utc_now_iso = (second, datetime.utcfromtimestamp(second).isoformat())
+    return _utc_now_iso[1]
 
 # Health check endpoint
-@app.get("/health")
+@app.get("/health", response_class=FastJSONResponse)
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow(),
+        "timestamp": utc_now_iso(),
         "version": "1.0.0",
         "service": "pharma-supply-chain-agentic-ai"
     }
 
+async def run_forecast(cache_key: str, request: ForecastRequest) -> Dict[str, Any]:
+    """Run one forecast on the forecast pool and cache it; shared by identical in-flight requests"""
+    agent = get_agent("forecast")
+
+    # Run forecasting with timeout. On timeout a job still queued in the
+    # pool is cancelled by wait_for, and a running one stops at its next
+    # phase boundary instead of fitting a model nobody will read
+    cancel_event = threading.Event()
+    try:
+        result = await asyncio.wait_for(run_in_pool(
+            "forecast", agent.forecast,
+            drug_id=request.item_id,
+            branch_id=request.entity_id if request.entity_type == "branch" else None,
+            horizon_days=request.horizon_days,
+            model=request.model,
+            cancel_event=cancel_event
+        ), timeout=120.0)  # 2 minute timeout
+    except asyncio.TimeoutError:
+        cancel_event.set()
+        logger.error("Forecasting timeout")
+        raise HTTPException(status_code=408, detail="Forecasting request timed out")
+    finally:
+        del forecast_in_flight[cache_key]
+
+    # Cache the result
+    set_cached_forecast(cache_key, result)
+    return result
+
 # API v1 endpoints
 @app.post("/api/v1/forecast/predict", response_model=ForecastResponse)
 async def forecast_demand(request: ForecastRequest):
@@ -104,9 +261,6 @@ async def forecast_demand(request: ForecastRequest):
     based on historical sales data.
     """
     try:
-        from agents.forecasting_agent import ForecastingAgent
-        import asyncio
-
         logger.info(f"Forecast request: {request}")
 
         # Check cache first
@@ -114,42 +268,22 @@ async def forecast_demand(request: ForecastRequest):
         cached_result = get_cached_forecast(cache_key)
         if cached_result:
             logger.info("Returning cached forecast result")
-            return ForecastResponse(**cached_result)
-
-        # Initialize forecasting agent
-        agent = ForecastingAgent()
-
-        # Run forecasting with timeout
-        async def run_forecast():
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, lambda: agent.forecast(
-                drug_id=request.item_id,
-                branch_id=request.entity_id if request.entity_type == "branch" else None,
-                horizon_days=request.horizon_days,
-                model=request.model
-            ))
-
-        try:
-            result = await asyncio.wait_for(run_forecast(), timeout=120.0)  # 2 minute timeout
-            # Cache the result
-            set_cached_forecast(cache_key, result)
-        except asyncio.TimeoutError:
-            logger.error("Forecasting timeout")
-            raise HTTPException(status_code=408, detail="Forecasting request timed out")
-
-        # Convert result to response format
-        forecast_data = []
-        for item in result.get('forecast', []):
-            forecast_data.append({
-                'date': item['date'],
-                'yhat': item['yhat'],
-                'yhat_lower': item.get('yhat_lower'),
-                'yhat_upper': item.get('yhat_upper')
-            })
+            return model_response(ForecastResponse(**cached_result))
+
+        # Single-flight: the forecast runs as its own task that identical
+        # requests share. Every request, including the one that started it,
+        # awaits it through a shield, so a disconnecting client never cancels
+        # the run other requests are waiting on
+        task = forecast_in_flight.get(cache_key)
+        if task is not None:
+            logger.info(f"Waiting for in-flight forecast: {cache_key}")
+        else:
+            task = forecast_in_flight[cache_key] = asyncio.ensure_future(run_forecast(cache_key, request))
 
-        response = ForecastResponse(**result)
+        # Waiters share the outcome, including the error if the run failed
+        result = await asyncio.shield(task)
 
-        return response
+        return model_response(ForecastResponse(**result))
 
     except Exception as e:
         logger.error(f"Error in forecast endpoint: {e}")
@@ -164,32 +298,25 @@ async def optimize_routes(request: RouteOptimizationRequest):
     efficient delivery routes.
     """
     try:
-        from agents.route_optimization_agent import RouteOptimizationAgent
-        import asyncio
-
         logger.info(f"Route optimization request: {request}")
 
-        # Initialize route optimization agent
-        agent = RouteOptimizationAgent()
+        agent = get_agent("route")
 
         # Run optimization with timeout
-        async def run_optimization():
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, lambda: agent.optimize_route(
+        try:
+            result = await asyncio.wait_for(run_in_pool(
+                "route", agent.optimize_route,
                 depot_id=request.depot_id,
                 destinations=request.destinations,
                 vehicle_capacity=request.vehicle_capacity,
                 max_time_hours=request.max_time_hours,
                 objective=request.objective
-            ))
-
-        try:
-            result = await asyncio.wait_for(run_optimization(), timeout=60.0)  # 1 minute timeout
+            ), timeout=60.0)  # 1 minute timeout
         except asyncio.TimeoutError:
             logger.error("Route optimization timeout")
             raise HTTPException(status_code=408, detail="Route optimization request timed out")
 
-        return RouteOptimizationResponse(**result)
+        return model_response(RouteOptimizationResponse(**result))
 
     except Exception as e:
         logger.error(f"Error in route optimization endpoint: {e}")
@@ -204,214 +331,275 @@ async def match_inventory(request: InventoryMatchingRequest):
     transfers between branches.
     """
     try:
-        from agents.inventory_matching_agent import InventoryMatchingAgent
-        import asyncio
-
         logger.info(f"Inventory matching request: {request}")
 
-        # Initialize inventory matching agent
-        agent = InventoryMatchingAgent()
+        agent = get_agent("inventory")
 
         # Run matching with timeout
-        async def run_matching():
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, lambda: agent.find_matches(
-                item_id=request.item_id,
-                policy=request.policy.dict()
-            ))
-
         try:
-            result = await asyncio.wait_for(run_matching(), timeout=90.0)  # 1.5 minute timeout
+            result = await asyncio.wait_for(run_in_pool(
+                "inventory", agent.find_matches,
+                item_id=request.item_id,
+                policy=request.policy.model_dump()
+            ), timeout=90.0)  # 1.5 minute timeout
         except asyncio.TimeoutError:
             logger.error("Inventory matching timeout")
             raise HTTPException(status_code=408, detail="Inventory matching request timed out")
 
-        return InventoryMatchingResponse(**result)
+        return model_response(InventoryMatchingResponse(**result))
 
     except Exception as e:
         logger.error(f"Error in inventory matching endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/alerts", response_model=AlertResponse)
-async def get_alerts(severity: Optional[str] = None, limit: int = 10):
+async def get_alerts(response: Response, severity: Optional[str] = None, limit: int = 10):
     """
     Get inventory alerts and notifications
 
     This endpoint returns current alerts from the Monitoring Agent with AI insights.
     """
     try:
-        from agents.monitoring_agent import MonitoringAgent
-        import asyncio
-
         logger.info(f"Alerts request: severity={severity}, limit={limit}")
 
-        # Initialize monitoring agent
-        agent = MonitoringAgent()
-
-        # Run monitoring with timeout
-        async def run_monitoring():
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, lambda: agent.generate_alerts(
-                severity_filter=severity,
-                limit=limit
-            ))
-
-        try:
-            result = await asyncio.wait_for(run_monitoring(), timeout=60.0)  # 1 minute timeout
-        except asyncio.TimeoutError:
-            logger.error("Monitoring timeout")
-            raise HTTPException(status_code=408, detail="Monitoring request timed out")
-
-        # Convert alerts to expected format
-        alerts = []
-        for alert in result.get('alerts', []):
-            alerts.append({
-                "severity": alert.get('severity', 'INFO'),
-                "branch_id": alert.get('branch_id', 'UNKNOWN'),
-                "item_id": alert.get('item_id', 'UNKNOWN'),
-                "alert_type": alert.get('alert_type', 'GENERAL'),
-                "message": alert.get('message', 'Alert generated by monitoring agent'),
-                "current_stock": alert.get('current_stock', 0),
-                "days_until_stockout": alert.get('days_until_stockout', 0),
-                "recommended_action": alert.get('recommended_action', 'REVIEW'),
-                "timestamp": alert.get('timestamp', datetime.utcnow()),
-                "is_resolved": alert.get('is_resolved', False)
-            })
-
-        return AlertResponse(
-            alerts=alerts,
-            total_alerts=result.get('total_alerts', 0),
-            critical_count=result.get('summary', {}).get('critical_count', 0),
-            warning_count=result.get('summary', {}).get('warning_count', 0),
-            info_count=result.get('summary', {}).get('info_count', 0),
-            ai_insights=result.get('ai_insights', ''),
-            status=result.get('status', 'unknown'),
-            message=result.get('message'),
-            generated_at=result.get('generated_at')
+        async def build_alerts():
+            agent = get_agent("monitoring")
+
+            # Run monitoring with timeout
+            try:
+                result = await asyncio.wait_for(
+                    agent.generate_alerts_async(severity_filter=severity, limit=limit,
+                                                executor=app.state.pools.get("monitoring")),
+                    timeout=60.0  # 1 minute timeout
+                )
+            except asyncio.TimeoutError:
+                logger.error("Monitoring timeout")
+                raise HTTPException(status_code=408, detail="Monitoring request timed out")
+
+            # AlertItem defaults fill the optional fields an alert leaves out
+            alerts = ALERT_LIST_ADAPTER.validate_python(result.get('alerts', []))
+
+            return AlertResponse(
+                alerts=alerts,
+                total_alerts=result.get('total_alerts', 0),
+                critical_count=result.get('summary', {}).get('critical_count', 0),
+                warning_count=result.get('summary', {}).get('warning_count', 0),
+                info_count=result.get('summary', {}).get('info_count', 0),
+                ai_insights=result.get('ai_insights', ''),
+                status=result.get('status', 'unknown'),
+                message=result.get('message'),
+                generated_at=result.get('generated_at')
+            )
+
+        # Shared short-lived cache; a failed or timed out run serves the last good result
+        result, cache_status = await response_cache.get_or_compute(
+            f"alerts:{severity}:{limit}", TTL_SHORT, build_alerts,
+            is_valid=lambda r: r.status != "error"
         )
+        response.headers["X-Cache"] = cache_status
+        return result
 
     except Exception as e:
         logger.error(f"Error in alerts endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Dashboard endpoints
-@app.get("/api/v1/dashboard/kpi")
-async def get_dashboard_kpi():
+# Serialized static dashboard payloads: name -> (time bucket, body, etag).
+# Only touched from the event loop, so it needs no lock
+static_responses: Dict[str, Tuple[int, bytes, str]] = {}
+
+def static_json_response(request: Request, name: str, build: Callable[[datetime], Any]) -> Response:
+    """
+    Serve a payload that only changes with its last_updated time bucket
+
+    The body is built and serialized once per TTL_LONG bucket, and clients
+    sending a matching If-None-Match get a 304 without a body.
+    """
+    bucket = int(time.time() // TTL_LONG)
+    cached = static_responses.get(name)
+    if cached is None or cached[0] != bucket:
+        content = build(datetime.utcfromtimestamp(bucket * TTL_LONG))
+        body = content.model_dump_json().encode() if isinstance(content, BaseModel) else json_bytes(content)
+        etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+        cached = static_responses[name] = (bucket, body, etag)
+
+    _, body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": f"max-age={TTL_NORMAL}"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or
+                          etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def kpi_metric(value: float, change: float, unit: str) -> KPIMetric:
+    """KPI metric whose trend follows the sign of its change"""
+    trend = "up" if change > 0 else "down" if change < 0 else "stable"
+    return KPIMetric(value=value, change=change, unit=unit, trend=trend)
+
+def build_kpi(last_updated: datetime) -> DashboardKPIs:
+    # TODO: Calculate real KPIs from data
+    return DashboardKPIs(
+        forecast_accuracy=kpi_metric(92.0, 2.1, "%"),
+        route_savings=kpi_metric(1250000, 15.3, "USD"),
+        stockout_reduction=kpi_metric(67.0, -5.2, "%"),
+        response_time=kpi_metric(245, -8, "ms"),
+        last_updated=last_updated
+    )
+
+def build_kpis(last_updated: datetime) -> Dict[str, Any]:
+    return {
+        "total_forecast_accuracy": 92.0,
+        "inventory_turnover": 12.8,
+        "delivery_on_time": 97.5,
+        "stockout_reduction": 67.0,
+        "cost_savings": 1250000,
+        "alerts_critical": 3,
+        "alerts_warning": 12,
+        "system_health": "healthy"
+    }
+
+@app.get("/api/v1/dashboard/kpi", response_model=DashboardKPIs)
+async def get_dashboard_kpi(request: Request):
     """Get dashboard KPI data"""
     try:
-        # TODO: Calculate real KPIs from data
-        return {
-            "forecast_accuracy": {"value": 92.0, "change": 2.1, "unit": "%"},
-            "route_savings": {"value": 1250000, "change": 15.3, "unit": "USD"},
-            "stockout_reduction": {"value": 67.0, "change": -5.2, "unit": "%"},
-            "response_time": {"value": 245, "change": -8, "unit": "ms"},
-            "last_updated": datetime.utcnow()
-        }
+        return static_json_response(request, "dashboard:kpi", build_kpi)
     except Exception as e:
         logger.error(f"Error in dashboard KPI endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/dashboard/kpis")
-async def get_dashboard_kpis():
+async def get_dashboard_kpis(request: Request):
     """Get dashboard KPI data in the format used by the UI"""
     try:
-        return {
-            "total_forecast_accuracy": 92.0,
-            "inventory_turnover": 12.8,
-            "delivery_on_time": 97.5,
-            "stockout_reduction": 67.0,
-            "cost_savings": 1250000,
-            "alerts_critical": 3,
-            "alerts_warning": 12,
-            "system_health": "healthy"
-        }
+        return static_json_response(request, "dashboard:kpis", build_kpis)
     except Exception as e:
         logger.error(f"Error in dashboard KPIs endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/v1/dashboard/alerts/summary")
-async def get_alerts_summary():
+@app.get("/api/v1/dashboard/alerts/summary", response_model=AlertSummary)
+async def get_alerts_summary(response: Response):
     """Get alerts summary for dashboard"""
     try:
-        # TODO: Get real alerts summary
-        return {
-            "critical": 3,
-            "warning": 12,
-            "info": 25,
-            "total": 40,
-            "last_updated": datetime.utcnow()
-        }
+        async def build_summary():
+            # Counts are aggregated inside MongoDB, so no inventory records are
+            # transferred to build the dashboard summary
+            agent = get_agent("monitoring")
+            summary = await run_in_pool("monitoring", agent.get_alert_summary)
+
+            return AlertSummary(
+                critical=summary.get("critical_count", 0),
+                warning=summary.get("warning_count", 0),
+                info=summary.get("info_count", 0),
+                total=summary.get("total_alerts", 0),
+                top_affected_branches=summary.get("top_affected_branches", []),
+                last_updated=datetime.utcnow()
+            )
+
+        result, cache_status = await response_cache.get_or_compute(
+            "dashboard:alerts_summary", TTL_NORMAL, build_summary)
+        response.headers["X-Cache"] = cache_status
+        return result
     except Exception as e:
         logger.error(f"Error in alerts summary endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # LangGraph Workflow Endpoint
+def workflow_initial_state(request: WorkflowRequest) -> Dict[str, Any]:
+    """Workflow input state for a validated workflow request"""
+    return {
+        "item_id": request.item_id,
+        "item_ids": request.item_ids,
+        "depot_id": request.depot_id,
+        "destinations": request.destinations,
+        "horizon_days": request.horizon_days,
+        "policy": request.policy.model_dump()
+    }
+
 @app.post("/api/v1/workflow/execute")
-async def execute_workflow(item_id: Optional[str] = None,
-                          depot_id: Optional[str] = None,
-                          destinations: Optional[str] = None,
-                          horizon_days: int = 30):
+async def execute_workflow(request: WorkflowRequest):
     """
     Execute complete supply chain optimization workflow
 
     This endpoint runs all agents in orchestrated sequence using LangGraph.
     """
     try:
-        from agents.langgraph_workflow import SupplyChainWorkflow
-        import asyncio
-
-        logger.info(f"Workflow execution request: item_id={item_id}, depot_id={depot_id}")
-
-        # Parse destinations if provided
-        dest_list = destinations.split(",") if destinations else []
-
-        # Initialize workflow
-        workflow = SupplyChainWorkflow()
-
-        initial_state = {
-            "item_id": item_id,
-            "depot_id": depot_id,
-            "destinations": dest_list,
-            "horizon_days": horizon_days,
-            "policy": {"safe_days": 14}
-        }
+        logger.info(f"Workflow execution request: item_id={request.item_id}, depot_id={request.depot_id}")
 
-        # Run workflow with timeout
-        async def run_workflow():
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, lambda: workflow.run_workflow(initial_state))
+        workflow = get_agent("workflow")
+        initial_state = workflow_initial_state(request)
 
+        # Run workflow with timeout. The workflow is async and already moves
+        # each agent call off the event loop, so it needs no worker thread
         try:
-            result = await asyncio.wait_for(run_workflow(), timeout=300.0)  # 5 minute timeout
+            result = await asyncio.wait_for(workflow.arun_workflow(initial_state), timeout=300.0)  # 5 minute timeout
         except asyncio.TimeoutError:
             logger.error("Workflow execution timeout")
             raise HTTPException(status_code=408, detail="Workflow execution timed out")
 
-        return {
-            "status": result.get("workflow_status", "unknown"),
-            "results": {
-                "forecast": result.get("demand_forecast"),
-                "route": result.get("route_plan"),
-                "transfers": result.get("transfer_plan"),
-                "alerts": result.get("alerts")
-            },
-            "kpi_metrics": result.get("kpi_metrics", {}),
-            "agent_logs": result.get("agent_logs", []),
-            "execution_time": "completed"
-        }
+        # Sent one section at a time, so the full body is never held as a
+        # single serialized buffer and the first bytes go out while later
+        # sections are still being encoded
+        async def body():
+            yield b'{"status":' + json_bytes(result.get("workflow_status", "unknown"))
+            yield b',"results":{"forecast":' + json_bytes(result.get("demand_forecast"))
+            yield b',"route":' + json_bytes(result.get("route_plan"))
+            yield b',"transfers":' + json_bytes(result.get("transfer_plan"))
+            yield b',"alerts":' + json_bytes(result.get("alerts"))
+            yield b'},"kpi_metrics":' + json_bytes(result.get("kpi_metrics", {}))
+            yield b',"agent_logs":' + json_bytes(result.get("agent_logs", []))
+            yield b',"execution_time":"completed"}'
+
+        return StreamingResponse(body(), media_type="application/json")
 
     except Exception as e:
         logger.error(f"Error in workflow execution endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/v1/workflow/stream")
+async def stream_workflow(request: WorkflowRequest):
+    """
+    Execute the supply chain workflow, streaming each agent's result as it completes
+
+    Responds with newline-delimited JSON events so clients can render
+    partial results before the whole workflow has finished.
+    """
+    try:
+        logger.info(f"Workflow stream request: item_id={request.item_id}, depot_id={request.depot_id}")
+
+        workflow = get_agent("workflow")
+        initial_state = workflow_initial_state(request)
+
+        async def events():
+            async for event in workflow.astream_workflow(initial_state):
+                yield json_bytes(event) + b"\n"
+
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    except Exception as e:
+        logger.error(f"Error in workflow stream endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Startup and shutdown events
 @app.on_event("startup")
 async def startup_event():
     """Application startup tasks"""
     logger.info("Starting Pharmaceutical Supply Chain Agentic AI...")
 
+    app.state.pools = {
+        name: ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"{name}-agent")
+        for name, size in AGENT_POOL_SIZES.items()
+    }
+
+    # Build the agent registry once. An agent whose optional dependencies are
+    # missing (e.g. OR-Tools) is retried on first use so its endpoint reports
+    # the error instead of the whole app failing to start
+    for name in AGENT_CLASSES:
+        try:
+            get_agent(name)
+        except Exception as e:
+            logger.warning(f"Could not initialize {name} agent: {e}")
+
     # TODO: Initialize database connections
-    # TODO: Initialize ML models
     # TODO: Start background tasks if needed
 
     logger.info("Application started successfully")
@@ -421,6 +609,12 @@ async def shutdown_event():
     """Application shutdown tasks"""
     logger.info("Shutting down Pharmaceutical Supply Chain Agentic AI...")
 
+    await response_cache.close()
+
+    for pool in app.state.pools.values():
+        pool.shutdown(wait=False)
+    app.state.pools = {}
+
     # TODO: Close database connections
     # TODO: Save model states if needed
     # TODO: Cleanup resources
@@ -429,10 +623,26 @@ async def shutdown_event():
 
 if __name__ == "__main__":
     import uvicorn
+
+    # DEV=1 keeps auto-reload for local iteration. Otherwise run without the
+    # file watcher or access log; for multiple cores use WEB_CONCURRENCY or
+    # gunicorn -c gunicorn.conf.py main:app, which preloads the app
+    dev_mode = os.getenv("DEV", "").lower() in ("1", "true", "yes")
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=1020,
-        reload=True,
-        log_level="info"
+        reload=dev_mode,
+        # "auto" picks uvloop and httptools (installed by uvicorn[standard])
+        # and falls back to asyncio/h11 where they are unavailable (Windows)
+        loop="auto",
+        http="auto",
+        access_log=dev_mode,
+        # Dashboards poll every few seconds; keep their connections open
+        # and shed load rather than queue without bound
+        timeout_keep_alive=30,
+        limit_concurrency=1000,
+        backlog=2048,
+        workers=None if dev_mode else int(os.getenv("WEB_CONCURRENCY", "1")),
+        log_level="info" if dev_mode else "warning"
     )
@@ -5,7 +5,7 @@ This module contains Pydantic models for API requests and responses.
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 # Forecasting Models
@@ -86,13 +86,15 @@ class InventoryMatchingResponse(BaseModel):
 
 # Monitoring/Alert Models
 class AlertItem(BaseModel):
+    # Overstock and understock alerts carry no days_until_stockout, so it and
+    # alert_type have defaults and agent alerts validate directly
     severity: str = Field(..., description="Alert severity (CRITICAL, WARNING, INFO)")
     branch_id: str = Field(..., description="Branch ID where alert occurred")
     item_id: str = Field(..., description="Item ID causing the alert")
-    alert_type: Optional[str] = Field(None, description="Type/category of the alert")
+    alert_type: Optional[str] = Field("GENERAL", description="Type/category of the alert")
     message: str = Field(..., description="Human-readable alert description")
     current_stock: int = Field(..., description="Current stock level")
-    days_until_stockout: float = Field(..., description="Days until stockout")
+    days_until_stockout: float = Field(0, description="Days until stockout")
     recommended_action: str = Field(..., description="Recommended action")
     timestamp: datetime = Field(default_factory=datetime.utcnow, description="Alert timestamp")
     is_resolved: bool = Field(False, description="Whether alert is resolved")
@@ -127,8 +129,18 @@ class AlertSummary(BaseModel):
     warning: int = Field(..., description="Number of warning alerts")
     info: int = Field(..., description="Number of info alerts")
     total: int = Field(..., description="Total number of alerts")
+    top_affected_branches: List[Tuple[str, int]] = Field(default_factory=list, description="Branches with the most alerts, as (branch_id, alert count)")
     last_updated: datetime = Field(default_factory=datetime.utcnow, description="Last update timestamp")
 
+# Workflow Models
+class WorkflowRequest(BaseModel):
+    item_id: Optional[str] = Field(None, description="Item/drug to forecast and rebalance")
+    item_ids: Optional[List[str]] = Field(None, description="Restrict workflow alerts to these items (forecasting and rebalancing use item_id)")
+    depot_id: Optional[str] = Field(None, description="Depot the delivery route starts from")
+    destinations: List[str] = Field(default_factory=list, description="Destination IDs for route optimization")
+    horizon_days: int = Field(30, ge=1, le=365, description="Number of days to forecast")
+    policy: InventoryPolicy = Field(default_factory=InventoryPolicy, description="Inventory policy parameters")
+
 # Health Check Model
 class HealthCheckResponse(BaseModel):
     status: str = Field(..., description="Service status")
@@ -0,0 +1,117 @@
+"""
+Tests for the vectorized inventory analysis in the monitoring agent
+"""
+
+import heapq
+import random
+import unittest
+from datetime import datetime
+
+from agents.monitoring_agent import MonitoringAgent
+
+
+class AnalyzeInventoryBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = MonitoringAgent()
+        self.now = datetime(2024, 1, 1)
+
+    def per_item(self, items):
+        return [alert for item in items
+                for alert in self.agent._analyze_inventory_item(item, self.now)]
+
+    def assert_matches_per_item(self, items):
+        self.assertEqual(self.agent._analyze_inventory_batch(items, self.now), self.per_item(items))
+
+    def test_numeric_records(self):
+        items = [
+            {"drug_id": "a", "current_stock": 5, "optimal_stock": 100, "safe_stock": 50, "demand_forecast": 300},
+            {"drug_id": "b", "current_stock": 500, "optimal_stock": 100, "safe_stock": 20, "demand_forecast": 30},
+        ]
+        self.assert_matches_per_item(items)
+
+    def test_none_stock_value_falls_back_to_item_analysis(self):
+        items = [
+            {"drug_id": "a", "current_stock": None, "optimal_stock": 100, "safe_stock": 50},
+            {"drug_id": "b", "current_stock": 5, "optimal_stock": 100, "safe_stock": 50, "demand_forecast": 300},
+        ]
+        self.assert_matches_per_item(items)
+
+    def test_string_stock_value_falls_back_to_item_analysis(self):
+        items = [
+            {"drug_id": "a", "current_stock": "7", "optimal_stock": 100, "safe_stock": 50},
+            {"drug_id": "b", "current_stock": 5, "optimal_stock": 100, "safe_stock": None, "demand_forecast": 300},
+        ]
+        self.assert_matches_per_item(items)
+
+
+class TopAlertSelectionTest(unittest.TestCase):
+    """_analyze_inventory_batch with limit/severity_filter, as _collect_alerts uses it"""
+
+    SEVERITY_ORDER = {"CRITICAL": 0, "WARNING": 1, "INFO": 2}
+
+    # Mixed records: critical, low + overstock (+ understock), plain overstock,
+    # understock only, and healthy stock
+    ITEMS = [
+        {"drug_id": "ok", "current_stock": 100, "optimal_stock": 100, "safe_stock": 50, "demand_forecast": 30},
+        {"drug_id": "low_over", "current_stock": 50, "optimal_stock": 20, "safe_stock": 10, "demand_forecast": 300},
+        {"drug_id": "critical", "current_stock": 5, "optimal_stock": 100, "safe_stock": 50, "demand_forecast": 300},
+        {"drug_id": "under", "current_stock": 40, "optimal_stock": 500, "safe_stock": 400, "demand_forecast": 30},
+        {"drug_id": "low_over_under", "current_stock": 50, "optimal_stock": 20, "safe_stock": 200, "demand_forecast": 300},
+        {"drug_id": "over", "current_stock": 500, "optimal_stock": 100, "safe_stock": 20, "demand_forecast": 30},
+        {"drug_id": "critical_2", "current_stock": 1, "optimal_stock": 100, "safe_stock": 50, "demand_forecast": 300},
+        {"drug_id": "low", "current_stock": 40, "optimal_stock": 100, "safe_stock": 10, "demand_forecast": 300},
+    ]
+
+    def setUp(self):
+        self.agent = MonitoringAgent()
+        self.now = datetime(2024, 1, 1)
+
+    def sort_key(self, alert):
+        return (self.SEVERITY_ORDER.get(alert["severity"], 3), alert["timestamp"])
+
+    def expected(self, items, limit, severity_filter):
+        alerts = [alert for item in items
+                  for alert in self.agent._analyze_inventory_item(item, self.now)]
+        if severity_filter is not None:
+            alerts = [alert for alert in alerts if alert["severity"] == severity_filter]
+        return sorted(alerts, key=self.sort_key)[:limit]
+
+    def actual(self, items, limit, severity_filter):
+        alerts = self.agent._analyze_inventory_batch(items, self.now, limit=limit,
+                                                     severity_filter=severity_filter)
+        return heapq.nsmallest(limit, alerts, key=self.sort_key)
+
+    def assert_matches(self, items, limit, severity_filter):
+        with self.subTest(limit=limit, severity_filter=severity_filter):
+            self.assertEqual(self.actual(items, limit, severity_filter),
+                             self.expected(items, limit, severity_filter))
+
+    def test_each_severity_and_limit(self):
+        for severity_filter in (None, "CRITICAL", "WARNING", "INFO"):
+            for limit in (1, 3):
+                self.assert_matches(self.ITEMS, limit, severity_filter)
+
+    def test_low_stock_and_overstock_on_one_item(self):
+        items = [item for item in self.ITEMS if item["drug_id"] in ("low_over", "over", "low_over_under", "low")]
+        for limit in (1, 3):
+            self.assert_matches(items, limit, "WARNING")
+        alerts = self.actual(items, 3, "WARNING")
+        self.assertEqual([(a["item_id"], a["alert_type"]) for a in alerts],
+                         [("low_over", "LOW_STOCK"), ("low_over", "OVERSTOCK"), ("low_over_under", "LOW_STOCK")])
+
+    def test_randomized_inventory(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            items = [
+                {"drug_id": f"d{i}", "current_stock": rng.randint(0, 600),
+                 "optimal_stock": rng.randint(1, 300), "safe_stock": rng.randint(0, 300),
+                 "demand_forecast": rng.choice([0, rng.randint(1, 600)])}
+                for i in range(rng.randint(1, 40))
+            ]
+            for severity_filter in (None, "CRITICAL", "WARNING", "INFO"):
+                for limit in (1, 3, 10):
+                    self.assert_matches(items, limit, severity_filter)
+
+
+if __name__ == "__main__":
+    unittest.main()
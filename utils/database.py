@@ -6,13 +6,32 @@ This module provides database connection and query utilities.
 
 from pymongo import MongoClient
 from pymongo.database import Database
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+import functools
 import logging
 import os
+import time
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# Fields returned for each daily sales history document
+SALES_FIELDS = {"_id": 0, "drug_id": 1, "drug_name": 1, "branch_id": 1, "quantity": 1, "date": 1}
+# Unique sales_history index created by scripts/load_datasets.py
+SALES_INDEX = [("drug_id", 1), ("branch_id", 1), ("date", -1)]
+# sales_history holds at most one document per drug, branch and day. Set to
+# False if that changes so per-branch queries sum each day with $group again
+SALES_DOCUMENTS_ARE_DAILY = True
+# Fields returned by get_drug_info; image URLs and load timestamps are left out
+DRUG_INFO_FIELDS = {"_id": 0, "id": 1, "name": 1, "generic_name": 1, "manufacturer": 1, "price": 1,
+                    "prescription_required": 1, "drug_content": 1, "disease_category": 1}
+# drugs index on id created by scripts/load_datasets.py
+DRUG_ID_INDEX = [("id", 1)]
+# The drug catalogue only changes when the datasets are reloaded, so lookups
+# are cached in process; call DataAccess.clear_drug_cache() after a reload
+DRUG_INFO_CACHE_SIZE = 4096
+DRUG_CATALOG_TTL_SECONDS = 300
+
 class DatabaseConnection:
     """MongoDB connection manager"""
 
@@ -60,11 +79,22 @@ def connect_to_mongo() -> Database:
     """Connect to MongoDB (alias for get_database)"""
     return get_database()
 
+@functools.lru_cache(maxsize=DRUG_INFO_CACHE_SIZE)
+def _find_drug_info(drug_id: str) -> Optional[Dict[str, Any]]:
+    """Cached drug lookup; errors propagate so they are never cached"""
+    return get_database().drugs.find_one({"id": drug_id}, DRUG_INFO_FIELDS, hint=DRUG_ID_INDEX)
+
 class DataAccess:
     """Data access layer for querying sales and inventory data"""
 
-    def __init__(self):
-        self.db = get_database()
+    # (expires_at, drugs) for get_all_drugs, against time.monotonic()
+    _all_drugs: Optional[Tuple[float, List[Dict[str, Any]]]] = None
+
+    @property
+    def db(self) -> Database:
+        # Resolved on use, so importing this module opens no connection and a
+        # preloading gunicorn master has no client for its workers to inherit
+        return get_database()
 
     def get_sales_history(self, drug_id: str, branch_id: Optional[str] = None,
                          days: int = 365) -> List[Dict[str, Any]]:
@@ -82,24 +112,36 @@ class DataAccess:
             start_date = datetime.utcnow() - timedelta(days=days)
             query["date"] = {"$gte": start_date}
 
-            # Aggregate per day to shrink payload while keeping signal
-            pipeline = [
-                {"$match": query},
-                {
-                    "$group": {
-                        "_id": "$date",
-                        "quantity": {"$sum": "$quantity"},
-                        "drug_id": {"$first": "$drug_id"},
-                        "drug_name": {"$first": "$drug_name"},
-                        "branch_id": {"$first": "$branch_id"}
-                    }
-                },
-                {"$sort": {"_id": -1}},  # latest dates first
-                {"$limit": days},  # one record per day max
-                {"$sort": {"_id": 1}},  # keep chronological order
-            ]
-
-            aggregated = list(self.db.sales_history.aggregate(pipeline, allowDiskUse=True))
+            if branch_id and SALES_DOCUMENTS_ARE_DAILY:
+                # (drug_id, branch_id, date) is unique, so the documents already
+                # are daily totals and can be read off the index in date order
+                daily = list(
+                    self.db.sales_history
+                    .find(query, SALES_FIELDS)
+                    .hint(SALES_INDEX)
+                    .sort("date", -1)  # latest dates first
+                    .limit(days)
+                )
+                daily.reverse()  # keep chronological order
+            else:
+                # Aggregate per day across branches to shrink payload while keeping signal
+                pipeline = [
+                    {"$match": query},
+                    {
+                        "$group": {
+                            "_id": "$date",
+                            "quantity": {"$sum": "$quantity"},
+                            "drug_id": {"$first": "$drug_id"},
+                            "drug_name": {"$first": "$drug_name"},
+                            "branch_id": {"$first": "$branch_id"},
+                            "date": {"$first": "$date"}
+                        }
+                    },
+                    {"$sort": {"_id": -1}},  # latest dates first
+                    {"$limit": days},  # one record per day max
+                    {"$sort": {"_id": 1}},  # keep chronological order
+                ]
+                daily = list(self.db.sales_history.aggregate(pipeline, allowDiskUse=True))
 
             sales_data = [
                 {
@@ -107,21 +149,11 @@ class DataAccess:
                     "drug_name": doc.get("drug_name", drug_id),
                     "branch_id": doc.get("branch_id", branch_id or "UNKNOWN"),
                     "quantity": doc.get("quantity", 0),
-                    "date": doc["_id"]
+                    "date": doc["date"]
                 }
-                for doc in aggregated
+                for doc in daily
             ]
 
-            # Defensive fallback: if aggregation returns nothing, fetch a small sample directly
-            if not sales_data:
-                cursor = (
-                    self.db.sales_history
-                    .find(query, {"drug_id": 1, "drug_name": 1, "branch_id": 1, "quantity": 1, "date": 1})
-                    .sort("date", 1)
-                    .limit(days)
-                )
-                sales_data = list(cursor)
-
             logger.info(
                 f"Retrieved {len(sales_data)} aggregated sales records for drug {drug_id} "
                 f"(last {days} days)"
@@ -148,11 +180,16 @@ class DataAccess:
             return []
 
     def get_all_drugs(self) -> List[Dict[str, Any]]:
-        """Get all drugs information"""
+        """Get all drugs information (cached for DRUG_CATALOG_TTL_SECONDS)"""
+        cached = self._all_drugs
+        if cached is not None and cached[0] > time.monotonic():
+            return list(cached[1])
+
         try:
             drugs = list(self.db.drugs.find({}))
+            self._all_drugs = (time.monotonic() + DRUG_CATALOG_TTL_SECONDS, drugs)
             logger.info(f"Retrieved {len(drugs)} drug records")
-            return drugs
+            return list(drugs)
 
         except Exception as e:
             logger.error(f"Error retrieving drugs: {e}")
@@ -161,27 +198,38 @@ class DataAccess:
     def get_drug_info(self, drug_id: str) -> Optional[Dict[str, Any]]:
         """Get information for a specific drug"""
         try:
-            drug = self.db.drugs.find_one({"id": drug_id})
-            return drug
+            drug = _find_drug_info(drug_id)
+            # Copy so callers cannot modify the cached document
+            return dict(drug) if drug is not None else None
 
         except Exception as e:
             logger.error(f"Error retrieving drug info for {drug_id}: {e}")
             return None
 
+    def clear_drug_cache(self):
+        """Drop cached drug lookups, e.g. after the drugs collection is reloaded"""
+        _find_drug_info.cache_clear()
+        self._all_drugs = None
+
 # Global data access instance
 data_access = DataAccess()
 
 def get_sales_data(drug_id: str, branch_id: Optional[str] = None, days: int = 365) -> List[Dict[str, Any]]:
-    """Convenience function to get sales data (direct DB query to avoid heavy loads)"""
+    """Convenience function to get sales data"""
+    return data_access.get_sales_history(drug_id, branch_id, days)
+
+def get_sales_data_many(drug_ids: List[str], branch_id: Optional[str] = None,
+                        days: int = 365) -> Dict[str, List[Dict[str, Any]]]:
+    """Get daily sales data for several drugs with a single aggregation query"""
     try:
         db = get_database()
+        ids_by_key = {drug_id.lower(): drug_id for drug_id in drug_ids}
         match_stage: Dict[str, Any] = {
-            "drug_id": drug_id.lower()
+            "drug_id": {"$in": list(ids_by_key)}
         }
         if branch_id:
             match_stage["branch_id"] = branch_id
 
-        # Limit to the most recent window of data to keep queries fast
         start_date = datetime.utcnow() - timedelta(days=days)
         match_stage["date"] = {"$gte": start_date}
 
@@ -189,48 +237,35 @@ def get_sales_data(drug_id: str, branch_id: Optional[str] = None, days: int = 36
             {"$match": match_stage},
             {
                 "$group": {
-                    "_id": "$date",
+                    "_id": {"drug_id": "$drug_id", "date": "$date"},
                     "quantity": {"$sum": "$quantity"},
-                    "drug_id": {"$first": "$drug_id"},
                     "drug_name": {"$first": "$drug_name"},
                     "branch_id": {"$first": "$branch_id"}
                 }
             },
-            {"$sort": {"_id": -1}},
-            {"$limit": days},
-            {"$sort": {"_id": 1}}
+            {"$sort": {"_id.date": 1}}
         ]
 
-        aggregated = list(db.sales_history.aggregate(pipeline, allowDiskUse=True))
-        logger.info(f"Aggregated sales rows for {drug_id}: {len(aggregated)}")
-
-        sales_data = [
-            {
-                "drug_id": doc.get("drug_id", drug_id.lower()),
+        sales_by_drug: Dict[str, List[Dict[str, Any]]] = {drug_id: [] for drug_id in drug_ids}
+        for doc in db.sales_history.aggregate(pipeline, allowDiskUse=True):
+            key = doc["_id"]["drug_id"]
+            drug_id = ids_by_key.get(key, key)
+            sales_by_drug.setdefault(drug_id, []).append({
+                "drug_id": key,
                 "drug_name": doc.get("drug_name", drug_id),
                 "branch_id": doc.get("branch_id", branch_id or "UNKNOWN"),
                 "quantity": doc.get("quantity", 0),
-                "date": doc["_id"]
-            }
-            for doc in aggregated
-        ]
-
-        # Fallback to a capped direct query if aggregation unexpectedly returns empty
-        if not sales_data:
-            cursor = (
-                db.sales_history
-                .find(match_stage, {"drug_id": 1, "drug_name": 1, "branch_id": 1, "quantity": 1, "date": 1})
-                .sort("date", 1)
-                .limit(days)
-            )
-            sales_data = list(cursor)
-            logger.info(f"Fallback sales rows for {drug_id}: {len(sales_data)}")
-
-        logger.info(f"Retrieved {len(sales_data)} sales records for drug {drug_id}")
-        return sales_data
+                "date": doc["_id"]["date"]
+            })
+
+        logger.info(
+            f"Retrieved {sum(len(rows) for rows in sales_by_drug.values())} sales records "
+            f"for {len(drug_ids)} drugs"
+        )
+        return sales_by_drug
     except Exception as e:
-        logger.error(f"Error retrieving sales data: {e}")
-        return []
+        logger.error(f"Error retrieving sales data for multiple drugs: {e}")
+        return {drug_id: [] for drug_id in drug_ids}
 
 def get_inventory_data(drug_id: str, branch_id: Optional[str] = None) -> List[Dict[str, Any]]:
     """Convenience function to get inventory data"""
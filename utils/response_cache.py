@@ -0,0 +1,144 @@
+"""
+Response cache for Pharmaceutical Supply Chain Agentic AI
+
+Caches JSON-serializable endpoint results for a short TTL. When REDIS_URL is
+set and redis is installed the cache lives in Redis and is shared by all
+uvicorn workers; otherwise each process keeps a bounded in-memory cache.
+
+Entries outlive their TTL for STALE_TTL_SECONDS so that a failing or timed
+out agent can fall back to the last good result. For Redis, configure the
+server with `maxmemory-policy allkeys-lfu` so hot dashboard keys survive
+memory pressure.
+"""
+
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from collections import OrderedDict
+import json
+import logging
+import os
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    logger.warning("Redis not available, using in-process response cache. Install with: pip install redis")
+
+# TTL policies (seconds)
+TTL_SHORT = 10
+TTL_NORMAL = 30
+TTL_LONG = 60
+
+# How long an expired entry is kept as a fallback for failed requests
+STALE_TTL_SECONDS = 3600
+# Maximum number of entries in the in-process cache
+LOCAL_CACHE_SIZE = 512
+
+KEY_PREFIX = "pharma:response:"
+
+class ResponseCache:
+    """TTL response cache with a stale fallback, backed by Redis or process memory"""
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self.redis_url = redis_url
+        self._redis = None
+        # key -> (stored_at, ttl, value); only touched from the event loop
+        self._local: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+
+    def _client(self):
+        if not (REDIS_AVAILABLE and self.redis_url):
+            return None
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    async def get(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """Return (value, is_fresh) or None if nothing usable is cached"""
+        entry = None
+        client = self._client()
+        if client is not None:
+            try:
+                raw = await client.get(KEY_PREFIX + key)
+                if raw is not None:
+                    data = json.loads(raw)
+                    entry = (data["stored_at"], data["ttl"], data["value"])
+            except Exception as e:
+                logger.warning(f"Redis cache read failed, using local cache: {e}")
+                entry = self._local.get(key)
+        else:
+            entry = self._local.get(key)
+
+        if entry is None:
+            return None
+
+        stored_at, ttl, value = entry
+        age = time.time() - stored_at
+        if age > STALE_TTL_SECONDS:
+            self._local.pop(key, None)
+            return None
+        if key in self._local:
+            self._local.move_to_end(key)
+        return value, age < ttl
+
+    async def set(self, key: str, value: Any, ttl: int):
+        """Store a JSON-serializable value"""
+        value = jsonable_encoder(value)
+        stored_at = time.time()
+
+        client = self._client()
+        if client is not None:
+            try:
+                payload = json.dumps({"stored_at": stored_at, "ttl": ttl, "value": value})
+                await client.set(KEY_PREFIX + key, payload, ex=STALE_TTL_SECONDS)
+                return
+            except Exception as e:
+                logger.warning(f"Redis cache write failed, using local cache: {e}")
+
+        self._local[key] = (stored_at, ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > LOCAL_CACHE_SIZE:
+            self._local.popitem(last=False)
+
+    async def get_or_compute(self, key: str, ttl: int, compute: Callable[[], Awaitable[Any]],
+                             is_valid: Callable[[Any], bool] = lambda value: True) -> Tuple[Any, str]:
+        """
+        Return (value, cache_status) where cache_status is HIT, MISS or STALE
+
+        A fresh entry is returned as is. Otherwise compute() runs; a valid result
+        is cached, while an exception or invalid result falls back to the stale
+        entry if there is one (invalid results are returned uncached otherwise).
+        """
+        cached = await self.get(key)
+        if cached is not None and cached[1]:
+            return cached[0], "HIT"
+
+        try:
+            value = await compute()
+        except Exception as e:
+            if cached is not None:
+                logger.warning(f"Serving stale response for {key}: {e}")
+                return cached[0], "STALE"
+            raise
+
+        if is_valid(value):
+            await self.set(key, value, ttl)
+            return value, "MISS"
+        if cached is not None:
+            logger.warning(f"Serving stale response for {key}: invalid result")
+            return cached[0], "STALE"
+        return value, "MISS"
+
+    async def close(self):
+        """Close the Redis connection pool if one was opened"""
+        if self._redis is not None:
+            # aclose() replaces close() in redis-py 5
+            await getattr(self._redis, "aclose", self._redis.close)()
+            self._redis = None
+
+# Global response cache instance
+response_cache = ResponseCache(os.getenv("REDIS_URL"))